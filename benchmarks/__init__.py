@@ -0,0 +1,7 @@
+"""
+Package: benchmarks
+Performance benchmarks for the Shopcart service
+
+Run with:
+    python -m benchmarks --help
+"""
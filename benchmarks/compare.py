@@ -0,0 +1,89 @@
+"""
+Compare a benchmark run with a baseline
+
+A benchmark regresses when its p95 latency grows by more than the tolerance
+plus the noise band (noise factor times the larger p95 spread between
+repeats), or when its SQL statements per request grow by more than the
+tolerance (at least half a statement). A benchmark also fails when more
+than the allowed share of its requests got an unexpected response, whatever
+the baseline did, since the latencies of failed requests mean nothing.
+"""
+
+TOLERANCE = 0.10
+NOISE_FACTOR = 2.0
+MIN_QUERY_DELTA = 0.5
+MAX_ERROR_RATE = 0.0
+
+
+def _p95_regressed(base: dict, current: dict, tolerance: float, noise: float) -> bool:
+    """Checks the p95 latency against the baseline"""
+    spread = max(base.get("p95_ms_stdev", 0.0), current.get("p95_ms_stdev", 0.0))
+    limit = base["p95_ms"] * (1 + tolerance) + noise * spread
+    return current["p95_ms"] > limit
+
+
+def _queries_regressed(base: dict, current: dict, tolerance: float) -> bool:
+    """Checks the SQL statements per request against the baseline"""
+    before = base.get("queries_per_request")
+    after = current.get("queries_per_request")
+    if before is None or after is None:
+        return False
+    return after - before > max(before * tolerance, MIN_QUERY_DELTA)
+
+
+def _errors_exceeded(current: dict, max_error_rate: float) -> bool:
+    """Checks the share of unexpected responses of a run"""
+    errors = current.get("errors", 0)
+    return errors > 0 and errors > current.get("requests", 0) * max_error_rate
+
+
+def compare(
+    baseline: dict,
+    current: dict,
+    tolerance=TOLERANCE,
+    noise=NOISE_FACTOR,
+    max_error_rate=MAX_ERROR_RATE,
+) -> list:
+    """Returns one row per benchmark present in both runs
+
+    Each row is (group, name, metric deltas, regressed metrics).
+    """
+    rows = []
+    for group, benchmarks in current["results"].items():
+        base_group = baseline["results"].get(group, {})
+        for name, result in benchmarks.items():
+            base = base_group.get(name)
+            if base is None:
+                continue
+            regressed = []
+            if _p95_regressed(base, result, tolerance, noise):
+                regressed.append("p95_ms")
+            if _queries_regressed(base, result, tolerance):
+                regressed.append("queries_per_request")
+            if _errors_exceeded(result, max_error_rate):
+                regressed.append("errors")
+            deltas = {
+                "p95_ms": (base["p95_ms"], result["p95_ms"]),
+                "queries_per_request": (
+                    base.get("queries_per_request"),
+                    result.get("queries_per_request"),
+                ),
+            }
+            rows.append((group, name, deltas, regressed))
+    return rows
+
+
+def print_comparison(rows: list) -> None:
+    """Prints the comparison as a table"""
+    print(f"{'benchmark':40} {'p95 base':>9} {'p95 now':>9} {'q base':>7} {'q now':>7}")
+    for group, name, deltas, regressed in rows:
+        p95_base, p95_now = deltas["p95_ms"]
+        q_base, q_now = (
+            "n/a" if value is None else f"{value:.1f}"
+            for value in deltas["queries_per_request"]
+        )
+        flag = "  REGRESSED " + ",".join(regressed) if regressed else ""
+        print(
+            f"{group + '/' + name:40} {p95_base:9.2f} {p95_now:9.2f} "
+            f"{q_base:>7} {q_now:>7}{flag}"
+        )
@@ -0,0 +1,146 @@
+"""
+Microbenchmarks for ShopCart serialization and totals
+
+Times ShopCart.serialize, ShopCart.deserialize, ShopCartItem.serialize and
+ShopCart.update_total_price on carts of different sizes, both on transient
+objects ("detached") and on objects loaded through the session ("attached").
+Totals are computed by the database, so they are only timed attached.
+A separate single call under tracemalloc reports the net allocated blocks
+and the peak traced memory of each operation.
+"""
+import time
+import tracemalloc
+from service.models import db, ShopCart
+from tests.factories import ShopCartFactory, ShopCartItemFactory
+from .stats import percentile
+
+SIZES = (1, 100, 10_000)
+
+
+def _deserialize(cart: ShopCart, data: dict) -> None:
+    """Deserializes a new cart, inside the session when the source cart is"""
+    new_cart = ShopCart()
+    if cart in db.session:
+        db.session.add(new_cart)
+    new_cart.deserialize(data)
+
+
+# name -> operation(cart, serialized cart)
+OPERATIONS = {
+    "ShopCart.serialize": lambda cart, data: cart.serialize(),
+    "ShopCart.deserialize": _deserialize,
+    "ShopCartItem.serialize": lambda cart, data: [item.serialize() for item in cart.items],
+    "ShopCart.update_total_price": lambda cart, data: cart.update_total_price(),
+}
+
+# Operations that work in the database and need an attached cart
+DATABASE_OPERATIONS = {"ShopCart.update_total_price"}
+
+
+def build_cart(items: int) -> ShopCart:
+    """Builds a transient cart holding items"""
+    shop_cart = ShopCartFactory(id=None)
+    for _ in range(items):
+        ShopCartItemFactory(shop_cart=shop_cart, quantity=1)
+    return shop_cart
+
+
+class Fixture:
+    """Supplies the cart an operation runs on"""
+
+    def __init__(self, items: int, attached: bool):
+        self.attached = attached
+        self.cart = build_cart(items)
+        self.data = self.cart.serialize()
+        if attached:
+            self.cart.create()
+        self.data["items"] = [dict(item, id=None) for item in self.data["items"]]
+
+    def load(self) -> ShopCart:
+        """Returns the cart with its items loaded"""
+        if not self.attached:
+            return self.cart
+        # discard anything the previous operation left in the session
+        db.session.rollback()
+        cart = ShopCart.find(self.cart.id)
+        len(cart.items)
+        return cart
+
+    def close(self):
+        """Removes the persisted cart"""
+        if self.attached:
+            db.session.rollback()
+            ShopCart.find(self.cart.id).delete()
+
+
+def measure_memory(operation, cart: ShopCart, data: dict) -> dict:
+    """Runs the operation once under tracemalloc"""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+        operation(cart, data)
+        _, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename"))
+    return {"allocated_blocks": blocks, "peak_kib": (peak - base) / 1024}
+
+
+def run_operation(name: str, fixture: Fixture, iterations: int) -> dict:
+    """Times one operation and measures its memory"""
+    operation = OPERATIONS[name]
+    latencies = []
+    for _ in range(iterations):
+        cart = fixture.load()
+        start = time.perf_counter()
+        operation(cart, fixture.data)
+        latencies.append(time.perf_counter() - start)
+    result = {
+        "iterations": iterations,
+        "p50_us": percentile(latencies, 50) * 1_000_000,
+        "p95_us": percentile(latencies, 95) * 1_000_000,
+    }
+    result.update(measure_memory(operation, fixture.load(), fixture.data))
+    return result
+
+
+def default_iterations(items: int) -> int:
+    """Keeps each operation to roughly the same amount of work"""
+    return max(3, min(200, 20_000 // max(items, 1)))
+
+
+def run(sizes=SIZES, iterations=None, names=None) -> dict:
+    """Runs every operation on every cart size, detached and attached"""
+    results = {}
+    for items in sizes:
+        for attached in (False, True):
+            fixture = Fixture(items, attached)
+            mode = "attached" if attached else "detached"
+            try:
+                for name in OPERATIONS:
+                    if names and name not in names:
+                        continue
+                    if not attached and name in DATABASE_OPERATIONS:
+                        continue
+                    results[f"{name}[{items},{mode}]"] = run_operation(
+                        name, fixture, iterations or default_iterations(items)
+                    )
+            finally:
+                fixture.close()
+    return results
+
+
+def print_results(results: dict) -> None:
+    """Prints the results as a table"""
+    print(
+        f"{'operation':48} {'iters':>5} {'p50 us':>10} {'p95 us':>10} "
+        f"{'blocks':>8} {'peak KiB':>9}"
+    )
+    for name, row in results.items():
+        print(
+            f"{name:48} {row['iterations']:5d} {row['p50_us']:10.1f} "
+            f"{row['p95_us']:10.1f} {row['allocated_blocks']:8d} {row['peak_kib']:9.1f}"
+        )
@@ -0,0 +1,74 @@
+"""
+Benchmarks for the ShopCart and ShopCartItem model operations
+
+Each operation runs against a freshly created cart so that the timings
+include the SQL work the routes trigger through the models.
+"""
+import time
+from service.models import db, ShopCart, ShopCartItem
+from service.models.shop_cart import ShopCartStatus
+from tests.factories import ShopCartFactory, ShopCartItemFactory
+from .stats import summarize, QueryCounter
+
+
+def _new_cart(items: int) -> ShopCart:
+    """Creates a persisted cart with items"""
+    shop_cart = ShopCartFactory(id=None)
+    for _ in range(items):
+        ShopCartItemFactory(id=None, shop_cart=shop_cart)
+    shop_cart.create()
+    return shop_cart
+
+
+def _new_item(shop_cart: ShopCart) -> ShopCartItem:
+    """Builds an unsaved item for a cart"""
+    return ShopCartItemFactory(id=None, shop_cart=shop_cart)
+
+
+# name -> (setup(cart) returning the argument, operation(argument))
+OPERATIONS = {
+    "ShopCart.create": (lambda cart: ShopCartFactory(id=None), lambda new: new.create()),
+    "ShopCart.find": (lambda cart: cart.id, ShopCart.find),
+    "ShopCart.find_by_user_id": (lambda cart: cart.user_id, ShopCart.find_by_user_id),
+    "ShopCart.find_by_status": (
+        lambda cart: ShopCartStatus.ACTIVE,
+        ShopCart.find_by_status,
+    ),
+    "ShopCart.update": (lambda cart: cart, lambda cart: cart.update()),
+    "ShopCart.update_total_price": (
+        lambda cart: cart,
+        lambda cart: cart.update_total_price(),
+    ),
+    "ShopCartItem.create": (_new_item, lambda item: item.create()),
+    "ShopCartItem.find": (lambda cart: cart.items[0].id, ShopCartItem.find),
+    "ShopCartItem.update": (lambda cart: cart.items[0], lambda item: item.update()),
+}
+
+
+def run_operation(name: str, iterations: int, items: int) -> dict:
+    """Times one model operation and counts its SQL statements"""
+    setup, operation = OPERATIONS[name]
+    counter = QueryCounter(db.engine)
+    latencies, queries = [], []
+    try:
+        for _ in range(iterations):
+            argument = setup(_new_cart(items))
+            db.session.expire_all()
+            before = counter.count
+            began = time.perf_counter()
+            operation(argument)
+            latencies.append(time.perf_counter() - began)
+            queries.append(counter.count - before)
+    finally:
+        counter.close()
+    # setup is excluded so throughput reflects the operation alone
+    return summarize(latencies, sum(latencies), queries)
+
+
+def run(iterations: int, items: int = 3, names=None) -> dict:
+    """Runs the selected model operations and returns their results by name"""
+    return {
+        name: run_operation(name, iterations, items)
+        for name in OPERATIONS
+        if not names or name in names
+    }
@@ -0,0 +1,184 @@
+"""
+HTTP benchmarks for the service routes
+
+Each scenario drives one flask-restx resource and method. A runner sends the
+requests either through the Flask test client (in process, counts SQL
+statements) or to a real gunicorn server started on a local port.
+"""
+import os
+import sys
+import json
+import time
+import random
+import subprocess
+import http.client
+from service.models import db
+from .stats import summarize, QueryCounter
+
+# (name, method, path template, needs a body)
+SCENARIOS = [
+    ("ShopcartCollection.get", "GET", "/api/shopcarts", False),
+    ("ShopcartCollection.post", "POST", "/api/shopcarts", True),
+    ("ShopcartResource.get", "GET", "/api/shopcarts/{shopcart_id}", False),
+    ("ShopcartResource.put", "PUT", "/api/shopcarts/{shopcart_id}", True),
+    ("ItemCollection.get", "GET", "/api/shopcarts/{shopcart_id}/items", False),
+    ("ItemCollection.post", "POST", "/api/shopcarts/{shopcart_id}/items", True),
+    ("ItemResource.get", "GET", "/api/shopcarts/{shopcart_id}/items/{item_id}", False),
+    ("ItemResource.put", "PUT", "/api/shopcarts/{shopcart_id}/items/{item_id}", True),
+    (
+        "ProductResource.get",
+        "GET",
+        "/api/shopcarts/{shopcart_id}/products/{product_id}",
+        False,
+    ),
+    ("UserResource.get", "GET", "/api/shopcarts/user/{user_id}", False),
+    ("FindStatusResource.get", "GET", "/api/shopcarts/status/ACTIVE", False),
+]
+
+# Listings that return every cart and are too slow for the large data sets
+HEAVY_SCENARIOS = {"ShopcartCollection.get"}
+
+
+def make_path(template: str, target: tuple) -> str:
+    """Fills the path template with the ids of a sampled cart"""
+    shopcart_id, user_id, item_id, product_id = target
+    return template.format(
+        shopcart_id=shopcart_id,
+        user_id=user_id,
+        item_id=item_id,
+        product_id=product_id,
+    )
+
+
+def make_body(method: str, path: str, target: tuple) -> dict:
+    """Builds a valid request body for a mutating scenario"""
+    shopcart_id, user_id, item_id, product_id = target
+    if "/items" in path:
+        return {
+            "id": item_id,
+            "shop_cart_id": shopcart_id,
+            "name": f"bench-{product_id}",
+            "product_id": product_id,
+            "quantity": random.randint(1, 5),
+            "price": 9.99,
+        }
+    return {
+        "user_id": user_id,
+        "name": f"bench-{method.lower()}",
+        "total_price": 0.0,
+        "status": "ACTIVE",
+    }
+
+
+######################################################################
+#  R U N N E R S
+######################################################################
+class ClientRunner:
+    """Sends requests through the Flask test client"""
+
+    name = "client"
+
+    def __init__(self, app):
+        self.client = app.test_client()
+        self.counter = QueryCounter(db.engine)
+
+    def request(self, method: str, path: str, body=None) -> tuple:
+        """Returns (status code, seconds, SQL statements)"""
+        before = self.counter.count
+        start = time.perf_counter()
+        resp = self.client.open(path, method=method, json=body)
+        elapsed = time.perf_counter() - start
+        return resp.status_code, elapsed, self.counter.count - before
+
+    def close(self):
+        """Releases the runner"""
+        self.counter.close()
+
+
+class GunicornRunner:
+    """Sends requests to a gunicorn server started for the benchmark
+
+    Queries per request are read from the X-Query-Count response header.
+    """
+
+    name = "gunicorn"
+
+    def __init__(self, port: int = 8099, workers: int = 1):
+        self.port = port
+        self.process = subprocess.Popen(  # pylint: disable=consider-using-with
+            [
+                sys.executable, "-m", "gunicorn",
+                "--bind", f"127.0.0.1:{port}",
+                "--workers", str(workers),
+                "--log-level", "warning",
+                "wsgi:app",
+            ],
+            env=dict(os.environ, REQUEST_TIMING_HEADERS="true"),
+        )
+        self._wait_until_ready()
+
+    def _wait_until_ready(self, timeout: float = 30.0):
+        """Polls /health until the server answers"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                if self.request("GET", "/health")[0] == 200:
+                    return
+            except OSError:
+                time.sleep(0.2)
+        self.close()
+        raise RuntimeError("gunicorn did not start")
+
+    def request(self, method: str, path: str, body=None) -> tuple:
+        """Returns (status code, seconds, SQL statements if reported)"""
+        headers = {}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers["Content-Type"] = "application/json"
+        conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=60)
+        start = time.perf_counter()
+        conn.request(method, path, body=payload, headers=headers)
+        resp = conn.getresponse()
+        resp.read()
+        elapsed = time.perf_counter() - start
+        conn.close()
+        queries = resp.getheader("X-Query-Count")
+        return resp.status, elapsed, int(queries) if queries else None
+
+    def close(self):
+        """Stops the server"""
+        self.process.terminate()
+        self.process.wait(timeout=30)
+
+
+######################################################################
+#  B E N C H M A R K
+######################################################################
+def run_scenario(runner, scenario: tuple, targets: list, requests: int) -> dict:
+    """Sends requests for one scenario and summarizes the samples"""
+    method, template, needs_body = scenario[1:]
+    samples = []
+    start = time.perf_counter()
+    for target in random.choices(targets, k=requests):
+        body = make_body(method, template, target) if needs_body else None
+        samples.append(runner.request(method, make_path(template, target), body))
+    return summarize(
+        [elapsed for _, elapsed, _ in samples],
+        time.perf_counter() - start,
+        [count for _, _, count in samples],
+        sum(1 for code, _, _ in samples if code >= 400),
+    )
+
+
+def run(runner, targets: list, requests: int, names=None, heavy: bool = True) -> dict:
+    """Runs the selected scenarios and returns their results by name"""
+    results = {}
+    for scenario in SCENARIOS:
+        name = scenario[0]
+        if names and name not in names:
+            continue
+        if not heavy and name in HEAVY_SCENARIOS:
+            continue
+        results[name] = run_scenario(runner, scenario, targets, requests)
+    return results
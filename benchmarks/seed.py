@@ -0,0 +1,61 @@
+"""
+Seed the database with benchmark data
+
+Carts and Items are built with the test factories so the data looks the
+same as in the unit tests. Rows are committed in chunks to keep memory flat.
+"""
+import random
+import logging
+from service.models import db, ShopCart, ShopCartItem
+from tests.factories import ShopCartFactory, ShopCartItemFactory
+
+logger = logging.getLogger("benchmarks")
+
+# Named data set sizes: (number of carts, items per cart)
+SIZES = {
+    "1k": (1_000, 3),
+    "1k-huge": (1_000, 500),
+    "100k": (100_000, 3),
+    "100k-huge": (100_000, 100),
+    "1m": (1_000_000, 3),
+}
+
+CHUNK_SIZE = 1000
+
+
+def reset() -> None:
+    """Removes all Carts and Items"""
+    db.session.query(ShopCartItem).delete()
+    db.session.query(ShopCart).delete()
+    db.session.commit()
+
+
+def seed(carts: int, items_per_cart: int, chunk_size: int = CHUNK_SIZE) -> None:
+    """Creates carts each holding items_per_cart Items"""
+    logger.info("Seeding %d carts with %d items each", carts, items_per_cart)
+    reset()
+    for start in range(0, carts, chunk_size):
+        chunk = []
+        for _ in range(min(chunk_size, carts - start)):
+            shop_cart = ShopCartFactory(id=None)
+            for _ in range(items_per_cart):
+                ShopCartItemFactory(
+                    id=None, shop_cart=shop_cart, quantity=random.randint(1, 5)
+                )
+            chunk.append(shop_cart)
+        db.session.add_all(chunk)
+        db.session.commit()
+        db.session.expunge_all()
+
+
+def sample_targets(limit: int = 1000) -> list:
+    """Returns (shopcart_id, user_id, item_id, product_id) tuples to request"""
+    rows = (
+        db.session.query(
+            ShopCart.id, ShopCart.user_id, ShopCartItem.id, ShopCartItem.product_id
+        )
+        .join(ShopCartItem, ShopCartItem.shop_cart_id == ShopCart.id)
+        .limit(limit)
+        .all()
+    )
+    return [tuple(row) for row in rows]
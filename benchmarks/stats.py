@@ -0,0 +1,74 @@
+"""
+Latency and query statistics for benchmark samples
+"""
+import math
+import statistics
+from sqlalchemy import event
+
+
+def percentile(samples: list, pct: float) -> float:
+    """Returns the pct percentile of the samples using nearest rank"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(math.ceil(pct / 100.0 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def summarize(latencies: list, wall_time: float, queries: list, errors: int = 0) -> dict:
+    """Summarizes the samples of one benchmark
+
+    Args:
+        latencies (list): seconds taken by each request
+        wall_time (float): seconds taken by the whole run
+        queries (list): SQL statements issued by each request (None if unknown)
+        errors (int): number of unexpected responses
+    """
+    known = [count for count in queries if count is not None]
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "rps": len(latencies) / wall_time if wall_time else 0.0,
+        "queries_per_request": sum(known) / len(known) if known else None,
+    }
+
+
+def aggregate(summaries: list) -> dict:
+    """Combines repeated runs of one benchmark into medians
+
+    The spread of p95 between runs is kept as p95_ms_stdev so that
+    comparisons can tell noise from a real change.
+    """
+    result = {}
+    for key, value in summaries[0].items():
+        values = [summary[key] for summary in summaries if summary[key] is not None]
+        if value is None or not values:
+            result[key] = None
+        elif key in ("requests", "errors"):
+            result[key] = sum(values)
+        else:
+            result[key] = statistics.median(values)
+    p95s = [summary["p95_ms"] for summary in summaries]
+    result["p95_ms_stdev"] = statistics.pstdev(p95s) if len(p95s) > 1 else 0.0
+    result["repeats"] = len(summaries)
+    return result
+
+
+# pylint: disable=too-few-public-methods
+class QueryCounter:
+    """Counts the SQL statements sent through an engine"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):  # pylint: disable=unused-argument
+        self.count += 1
+
+    def close(self):
+        """Stops counting"""
+        event.remove(self.engine, "before_cursor_execute", self._on_execute)
@@ -0,0 +1,118 @@
+"""
+Benchmark results history
+
+Results are kept as JSON files under
+<results dir>/<machine>/<commit>_<carts>-<items>-<runner>.json so that runs
+are only ever compared with runs from the same kind of machine, and the
+runs of one commit on different data sets or runners are all kept.
+"""
+import os
+import json
+import time
+import hashlib
+import platform
+import subprocess
+
+RESULTS_DIR = os.getenv(
+    "BENCHMARK_RESULTS", os.path.join(os.path.dirname(__file__), "results")
+)
+
+# What a run was made on, only runs that agree on all of them are comparable
+DATA_SET_KEYS = ("carts", "items", "runner")
+
+
+def fingerprint() -> str:
+    """Returns a short id of the machine and interpreter running the benchmark"""
+    parts = [
+        platform.system(),
+        platform.machine(),
+        platform.processor(),
+        str(os.cpu_count()),
+        platform.python_implementation(),
+        platform.python_version(),
+    ]
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()[:12]
+
+
+def current_commit() -> str:
+    """Returns the short hash of the checked out commit"""
+    try:
+        output = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            check=True,
+            text=True,
+        )
+        return output.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def data_set(meta: dict) -> str:
+    """Returns the part of a results file name naming the data set and runner"""
+    return "-".join(str(meta.get(key, "")) for key in DATA_SET_KEYS)
+
+
+def save(results: dict, meta: dict, commit=None, results_dir=RESULTS_DIR) -> str:
+    """Stores a run and returns the path of the file written"""
+    commit = commit or current_commit()
+    machine = fingerprint()
+    path = os.path.join(results_dir, machine, f"{commit}_{data_set(meta)}.json")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    record = {
+        "commit": commit,
+        "machine": machine,
+        "timestamp": time.time(),
+        "meta": meta,
+        "results": results,
+    }
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(record, file, indent=2, sort_keys=True)
+    return path
+
+
+def runs(results_dir=RESULTS_DIR):
+    """Yields the runs stored for this machine"""
+    folder = os.path.join(results_dir, fingerprint())
+    if not os.path.isdir(folder):
+        return
+    for name in sorted(os.listdir(folder)):
+        if name.endswith(".json"):
+            with open(os.path.join(folder, name), encoding="utf-8") as file:
+                yield json.load(file)
+
+
+def matches(record: dict, meta) -> bool:
+    """Checks that a run was made on the data set and runner of meta"""
+    return meta is None or all(record["meta"].get(key) == meta.get(key) for key in DATA_SET_KEYS)
+
+
+def load(ref: str, meta=None, results_dir=RESULTS_DIR) -> dict:
+    """Loads a run by file path, or the latest run of a commit for this machine
+
+    With meta, only a run of the same data set and runner is loaded.
+    """
+    if os.path.isfile(ref):
+        with open(ref, encoding="utf-8") as file:
+            return json.load(file)
+    record = max(
+        (record for record in runs(results_dir) if record["commit"] == ref and matches(record, meta)),
+        key=lambda record: record["timestamp"],
+        default=None,
+    )
+    if record is None:
+        raise FileNotFoundError(f"No run stored for {ref}")
+    return record
+
+
+def latest(exclude=None, meta=None, results_dir=RESULTS_DIR):
+    """Returns the most recent run for this machine, skipping one commit
+
+    With meta, only the runs of the same data set and runner are considered,
+    the latencies of other runs are not comparable.
+    """
+    return max(
+        (record for record in runs(results_dir) if record["commit"] != exclude and matches(record, meta)),
+        key=lambda record: record["timestamp"],
+        default=None,
+    )
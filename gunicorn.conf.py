@@ -0,0 +1,140 @@
+"""
+Gunicorn configuration
+
+Sizes the workers from the CPU quota of the container instead of the CPU
+count of the node, and loads the app once in the master so workers share
+its memory copy-on-write. Every setting can be overridden through the
+environment:
+
+    GUNICORN_WORKER_CLASS  sync, gthread (default) or gevent
+    GUNICORN_WORKERS       number of worker processes
+    GUNICORN_THREADS       threads per gthread worker (default 4)
+    GUNICORN_PRELOAD       load the app in the master (default true)
+    GUNICORN_BIND          address to listen on (default 0.0.0.0:$PORT)
+    GUNICORN_MAX_REQUESTS  recycle a worker after this many requests (default 1000)
+    GUNICORN_MAX_REQUESTS_JITTER  random extra requests so workers do not
+                           all recycle at once (default 100)
+
+Workers are also recycled once their RSS is over MEMORY_SOFT_LIMIT_MB
+(see service/common/memory.py).
+
+The gevent worker needs the gevent package, which is not a dependency.
+"""
+import os
+import gc
+import math
+
+CGROUP_ROOT = "/sys/fs/cgroup"
+
+
+def cpu_limit(root: str = CGROUP_ROOT) -> float:
+    """Returns the CPUs this container may use
+
+    Reads the cgroup v2 cpu.max or the cgroup v1 CFS quota and falls back
+    to the number of CPUs when there is no quota.
+    """
+    try:
+        with open(os.path.join(root, "cpu.max"), encoding="utf-8") as file:
+            quota, period = file.read().split()
+    except OSError:
+        try:
+            with open(os.path.join(root, "cpu", "cpu.cfs_quota_us"), encoding="utf-8") as file:
+                quota = file.read().strip()
+            with open(os.path.join(root, "cpu", "cpu.cfs_period_us"), encoding="utf-8") as file:
+                period = file.read().strip()
+        except OSError:
+            quota, period = "max", "1"
+    if quota in ("max", "-1"):
+        return float(os.cpu_count() or 1)
+    return int(quota) / int(period)
+
+
+def worker_counts(kind: str, cpus: float) -> tuple:
+    """Returns (workers, threads) for the worker class and CPU limit"""
+    cores = max(1, math.ceil(cpus))
+    if kind == "sync":
+        # Sync workers block on the database so keep a few per core
+        return 2 * cores + 1, 1
+    # gthread and gevent overlap database waits inside one process
+    return cores, int(os.getenv("GUNICORN_THREADS", "4"))
+
+
+######################################################################
+# Settings
+######################################################################
+bind = os.getenv("GUNICORN_BIND", f"0.0.0.0:{os.getenv('PORT', '8080')}")
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+workers, threads = worker_counts(worker_class, cpu_limit())
+workers = int(os.getenv("GUNICORN_WORKERS", str(workers)))
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() == "true"
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "1000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "100"))
+
+
+######################################################################
+# Server hooks
+######################################################################
+def when_ready(server):
+    """Releases the master's connections and freezes the preloaded app"""
+    if not server.cfg.preload_app:
+        return
+    # pylint: disable=import-outside-toplevel
+    from service.models import db
+
+    with server.app.wsgi().app_context():
+        db.engine.dispose()
+    # Move the app's objects out of the collector so that collections in
+    # the workers do not touch, and copy, the shared pages
+    gc.freeze()
+    server.log.info("Using %d %s workers with %d threads", server.cfg.workers, worker_class, threads)
+
+
+def post_fork(server, worker):  # pylint: disable=unused-argument
+    """Gives the worker its own connections and log thread"""
+    if not server.cfg.preload_app:
+        return
+    # pylint: disable=import-outside-toplevel
+    from service.models import db
+    from service.common import log_handlers
+
+    app = server.app.wsgi()
+    with app.app_context():
+        # Drop the pool inherited from the master without closing its sockets
+        db.engine.dispose(close=False)
+    log_handlers.restart_listener(app)
+
+
+def post_request(worker, req, environ, resp):  # pylint: disable=unused-argument
+    """Stops the worker gracefully once the memory watchdog asks for it"""
+    app = getattr(worker, "wsgi", None)
+    watchdog = app.extensions.get("memory_watchdog") if app else None
+    if watchdog is not None and watchdog.recycle and worker.alive:
+        worker.log.info("Recycling worker (pid: %s) over its memory limit", worker.pid)
+        # Same as max_requests: finish the in-flight requests, then exit
+        worker.alive = False
+
+
+def worker_exit(server, worker):  # pylint: disable=unused-argument
+    """Writes out buffered Items and log records before the worker exits"""
+    # pylint: disable=import-outside-toplevel
+    from service.common import log_handlers
+
+    app = getattr(worker, "wsgi", None)
+    if app is None:
+        return
+    buffer = app.extensions.get("write_behind")
+    if buffer is not None:
+        buffer.flush()
+    listener = app.extensions.get("log_listener")
+    if listener is not None:
+        log_handlers.stop_listener(listener)
+
+
+def child_exit(server, worker):  # pylint: disable=unused-argument
+    """Removes the live gauges of a dead worker from the Prometheus files"""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        # pylint: disable=import-outside-toplevel
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
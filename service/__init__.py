@@ -20,9 +20,9 @@ and SQL database
 """
 import sys
 from flask import Flask
-from flask_restx import Api
 from service import config
 from service.common import log_handlers
+from service.common.startup import BootProfile, CachedSpecApi, check_schema
 
 # Will be initialize when app is created
 api = None  # pylint: disable=invalid-name
@@ -40,17 +40,64 @@ api = None  # pylint: disable=invalid-name
 ############################################################
 # Initialize the Flask instance
 ############################################################
-def create_app():
-    """Initialize the core application."""
+def create_app(load_routes: bool = True):
+    """Initialize the core application.
+
+    CLI commands that only need the database can use
+    FLASK_APP="service:create_app(load_routes=False)" to skip the routes,
+    the Swagger models and the schema check.
+    """
+    boot = BootProfile()
     # Create Flask application
     app = Flask(__name__)
     app.config.from_object(config)
 
     app.url_map.strict_slashes = False
 
+    # Initialize Plugins
+    # pylint: disable=import-outside-toplevel
+    from service.models.persistent_base import db
+
+    with boot.phase("database"):
+        db.init_app(app)
+
+    with app.app_context():
+        # Dependencies require we import the routes AFTER the Flask app is created
+        # pylint: disable=wrong-import-position, wrong-import-order, unused-import, cyclic-import
+        from service import models  # noqa: F401 E402
+        from service.common import cli_commands  # noqa: F401, E402
+
+        if load_routes:
+            with boot.phase("routes"):
+                load_api(app)
+
+            with boot.phase("schema"):
+                try:
+                    check_schema(app, db)
+                except Exception as error:  # pylint: disable=broad-except
+                    app.logger.critical("%s: Cannot continue", error)
+                    # gunicorn requires exit code 4 to stop spawning workers when they die
+                    sys.exit(4)
+
+        # Set up logging for production
+        with boot.phase("logging"):
+            log_handlers.init_logging(app, "gunicorn.error")
+
+        app.extensions["boot_profile"] = boot.as_dict()
+        app.logger.info(70 * "*")
+        app.logger.info("  S E R V I C E   R U N N I N G  ".center(70, "*"))
+        app.logger.info(70 * "*")
+
+        app.logger.info("Service initialized in %s", boot.report())
+
+        return app
+
+
+def load_api(app):
+    """Creates the RESTX API, imports the routes and adds the request hooks"""
     # Initialize the RESTX API
     global api
-    api = Api(
+    api = CachedSpecApi(
         app,
         version="1.0.0",
         title="Shopcart REST API Service",
@@ -62,32 +109,39 @@ def create_app():
         prefix="/api",
     )
 
-    # Initialize Plugins
-    # pylint: disable=import-outside-toplevel
-    from service.models.persistent_base import db
+    # pylint: disable=import-outside-toplevel, unused-import, cyclic-import
+    from service import routes  # noqa: F401 E402
+    from service.common import error_handlers  # noqa: F401, E402
+    from service.common import admission, coalesce, events, health, memory, metrics, rate_limit  # noqa: E402
+    from service.common import representations, request_timing, write_behind  # noqa: E402
 
-    db.init_app(app)
+    # Encode the JSON responses with the fastest encoder installed
+    representations.init_representations(app)
 
-    with app.app_context():
-        # Dependencies require we import the routes AFTER the Flask app is created
-        # pylint: disable=wrong-import-position, wrong-import-order, unused-import, cyclic-import
-        from service import routes, models  # noqa: F401 E402
-        from service.common import error_handlers, cli_commands  # noqa: F401, E402
+    # Cache the database check behind /health/ready
+    health.init_health(app)
 
-        try:
-            db.create_all()
-        except Exception as error:  # pylint: disable=broad-except
-            app.logger.critical("%s: Cannot continue", error)
-            # gunicorn requires exit code 4 to stop spawning workers when they die
-            sys.exit(4)
+    # Record Prometheus metrics for every request
+    metrics.init_metrics(app)
 
-        # Set up logging for production
-        log_handlers.init_logging(app, "gunicorn.error")
+    # Count queries and time every request
+    request_timing.init_request_timing(app)
 
-        app.logger.info(70 * "*")
-        app.logger.info("  S E R V I C E   R U N N I N G  ".center(70, "*"))
-        app.logger.info(70 * "*")
+    # Watch the worker RSS and record the peak of every route
+    memory.init_memory_watchdog(app)
 
-        app.logger.info("Service initialized!")
+    # Reject clients that write too fast before they reach the database
+    rate_limit.init_rate_limit(app)
 
-        return app
+    # Buffer rapid Item updates when write-behind is enabled, flushing them
+    # before a read joins an identical one in flight
+    write_behind.init_write_behind(app)
+
+    # Let identical concurrent reads share one response, waiters take no slot
+    coalesce.init_coalesce(app)
+
+    # Cap the requests in flight and shed the ones that waited too long
+    admission.init_admission(app)
+
+    # Push cart changes to the event streams of the browsers
+    events.init_events(app)
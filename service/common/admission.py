@@ -0,0 +1,160 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Admission Control
+
+Caps the /api requests a worker serves at once at ADMISSION_MAX_IN_FLIGHT.
+Requests over the cap wait in a bounded priority queue where cheap requests
+go ahead of the heavy listings in ADMISSION_HEAVY_ENDPOINTS.
+
+A request is answered with 503 instead of being served when:
+  - the queue is full
+  - it waited longer than ADMISSION_QUEUE_BUDGET_MS (half of it for heavy ones)
+  - the recent average wait is already over its budget
+  - a proxy's X-Request-Start shows it spent the budget in the backlog
+
+The gunicorn worker needs more threads than the cap so that requests wait
+here, where they can be shed, rather than in the gunicorn backlog.
+"""
+import time
+import heapq
+import itertools
+import threading
+from flask import g, request
+from service.common import status
+from service.common.metrics import ADMISSION_REJECTED
+
+HIGH, LOW = 0, 1
+
+# Weight of the newest wait in the moving average
+ALPHA = 0.2
+
+
+class AdmissionController:
+    """Counts in-flight requests and hands free slots to the waiters by priority"""
+
+    def __init__(self, limit: int, queue_size: int):
+        self.limit = limit
+        self.queue_size = queue_size
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.waiters = []
+        self.counter = itertools.count()
+        self.avg_wait = 0.0
+
+    def _observe(self, wait: float) -> None:
+        self.avg_wait += ALPHA * (wait - self.avg_wait)
+
+    def acquire(self, priority: int, timeout: float) -> str:
+        """Waits up to timeout seconds for a slot
+
+        Returns None once admitted, or why the request was rejected.
+        """
+        with self.lock:
+            if self.in_flight < self.limit and not self.waiters:
+                self.in_flight += 1
+                self._observe(0.0)
+                return None
+            if len(self.waiters) >= self.queue_size:
+                return "queue_full"
+            if self.avg_wait > timeout:
+                return "overloaded"
+            # [priority, arrival, wake up event, admitted]
+            waiter = [priority, next(self.counter), threading.Event(), False]
+            heapq.heappush(self.waiters, waiter)
+
+        start = time.monotonic()
+        waiter[2].wait(timeout)
+        with self.lock:
+            self._observe(time.monotonic() - start)
+            if waiter[3]:
+                return None
+            self.waiters.remove(waiter)
+            heapq.heapify(self.waiters)
+            return "deadline"
+
+    def release(self) -> None:
+        """Passes the slot to the first waiter or frees it"""
+        with self.lock:
+            if self.waiters:
+                waiter = heapq.heappop(self.waiters)
+                waiter[3] = True
+                waiter[2].set()
+            else:
+                self.in_flight -= 1
+
+
+def upstream_wait(header: str) -> float:
+    """Returns the seconds since a proxy stamped X-Request-Start
+
+    Accepts "t=<seconds>" (nginx) or plain milliseconds or microseconds.
+    """
+    try:
+        start = float(header.strip().removeprefix("t="))
+    except ValueError:
+        return 0.0
+    if start > 1e14:
+        start /= 1e6
+    elif start > 1e11:
+        start /= 1e3
+    return max(time.time() - start, 0.0)
+
+
+######################################################################
+# Request hooks
+######################################################################
+def init_admission(app):
+    """Set up admission control in front of the API resources"""
+    limit = app.config["ADMISSION_MAX_IN_FLIGHT"]
+    if not limit:
+        return None
+    controller = AdmissionController(limit, app.config["ADMISSION_QUEUE_SIZE"])
+    app.extensions["admission"] = controller
+    budget = app.config["ADMISSION_QUEUE_BUDGET_MS"] / 1000
+    heavy = set(filter(None, app.config["ADMISSION_HEAVY_ENDPOINTS"].split(",")))
+
+    @app.before_request
+    def admit_request():  # pylint: disable=unused-variable
+        """Waits for a slot or sheds the request"""
+        if not request.path.startswith("/api/"):
+            return None
+        priority = LOW if request.method == "GET" and request.endpoint in heavy else HIGH
+        timeout = budget / 2 if priority == LOW else budget
+        timeout -= upstream_wait(request.headers.get("X-Request-Start", ""))
+        reason = controller.acquire(priority, timeout) if timeout > 0 else "upstream"
+        if reason is None:
+            g.admitted = True
+            return None
+        ADMISSION_REJECTED.labels(request.endpoint or "none", reason).inc()
+        app.logger.warning("Shedding %s %s: %s", request.method, request.path, reason)
+        return (
+            {
+                "status_code": status.HTTP_503_SERVICE_UNAVAILABLE,
+                "error": "Service Unavailable",
+                "message": "The service is overloaded, please retry",
+            },
+            status.HTTP_503_SERVICE_UNAVAILABLE,
+            {"Retry-After": "1"},
+        )
+
+    @app.teardown_request
+    def release_request(exc):  # pylint: disable=unused-variable,unused-argument
+        """Frees the slot of an admitted request"""
+        if g.pop("admitted", False):
+            controller.release()
+
+    return controller
@@ -0,0 +1,392 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Bulk Export and Import
+
+Moves the shop_cart and shop_cart_item tables to and from files without
+going through the models, for the shopcarts-export and shopcarts-import
+commands.
+
+On Postgres, CSV and NDJSON are streamed by COPY ... TO STDOUT straight
+into the file, so rows are never turned into Python objects. Other
+databases, and the columnar Parquet and Arrow formats, read the rows
+through a server-side cursor a chunk at a time. Memory stays flat either
+way, whatever the size of the tables. Prices are written as they are
+stored, in whole cents.
+
+Parquet and Arrow need the pyarrow package, from the columnar extra.
+Their schema comes from the column types, so every chunk of a file has
+the same one.
+
+Imports load the files the export writes, with COPY ... FROM STDIN on
+Postgres and executemany() batches elsewhere, in one transaction per
+table. The secondary indexes are dropped for the load and built once at
+the end, and the id sequence is moved past the loaded ids. Rows loaded
+this way skip the change events and the outbox.
+"""
+import csv
+import json
+import enum
+import random
+import datetime
+import itertools
+from contextlib import contextmanager
+from psycopg import sql
+from service.models import db, ShopCart, ShopCartItem
+from service.models.shop_cart import ShopCartStatus
+
+FORMATS = ("csv", "ndjson", "parquet", "arrow")
+
+# Bytes of a file sent to COPY at a time
+COPY_BUFFER = 1 << 20
+
+# Columns exported from each table
+COLUMNS = {
+    "shop_cart": (
+        ShopCart.id,
+        ShopCart.user_id,
+        ShopCart.name,
+        ShopCart.total_price,
+        ShopCart.status,
+        ShopCart.updated_at,
+    ),
+    "shop_cart_item": (
+        ShopCartItem.id,
+        ShopCartItem.shop_cart_id,
+        ShopCartItem.name,
+        ShopCartItem.product_id,
+        ShopCartItem.quantity,
+        ShopCartItem.price,
+    ),
+}
+
+# Writes one JSON document per line, the quote and delimiter can not appear in JSON text
+COPY_OPTIONS = {
+    "csv": "FORMAT csv, HEADER",
+    "ndjson": "FORMAT csv, QUOTE E'\\x01', DELIMITER E'\\x02'",
+}
+
+
+def export_query(table: str, status=None, since=None, until=None):
+    """Returns the SELECT of a table, filtered by the status and update time of the ShopCarts
+
+    Args:
+        table (str): shop_cart or shop_cart_item
+        status (str): only the ShopCarts with this status, and their Items
+        since (datetime): only the ShopCarts updated at or after this time
+        until (datetime): only the ShopCarts updated before this time
+    """
+    statement = db.select(*COLUMNS[table])
+    if table == "shop_cart_item":
+        statement = statement.join(ShopCart, ShopCart.id == ShopCartItem.shop_cart_id)
+    if status:
+        statement = statement.where(ShopCart.status == status)
+    if since:
+        statement = statement.where(ShopCart.updated_at >= since)
+    if until:
+        statement = statement.where(ShopCart.updated_at < until)
+    return statement.order_by(COLUMNS[table][0])
+
+
+######################################################################
+# Postgres COPY
+######################################################################
+def copy_to(statement, fmt: str, stream) -> int:
+    """Streams a SELECT into a binary stream with COPY and returns the rows written"""
+    compiled = statement.compile(dialect=db.engine.dialect)
+    query = str(compiled)
+    if fmt == "ndjson":
+        query = f"SELECT row_to_json(export) FROM ({query}) AS export"
+    with db.engine.connect() as conn:
+        cursor = conn.connection.driver_connection.cursor()
+        with cursor.copy(f"COPY ({query}) TO STDOUT WITH ({COPY_OPTIONS[fmt]})", compiled.params) as copy:
+            for data in copy:
+                stream.write(data)
+        rows = cursor.rowcount
+        cursor.close()
+    return rows
+
+
+######################################################################
+# Server-side cursor
+######################################################################
+def plain(value):
+    """Returns a column value as CSV and JSON writers expect it"""
+    if isinstance(value, enum.Enum):
+        return value.name
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return value
+
+
+def chunks(statement, size: int):
+    """Yields the rows of a SELECT a chunk at a time from a server-side cursor"""
+    with db.engine.connect() as conn:
+        result = conn.execution_options(yield_per=size).execute(statement)
+        yield from result.partitions()
+
+
+def write_rows(statement, fmt: str, stream, size: int) -> int:
+    """Writes the rows of a SELECT as CSV or NDJSON to a text stream, returns the rows written"""
+    names = [column.name for column in statement.selected_columns]
+    writer = csv.writer(stream)
+    if fmt == "csv":
+        writer.writerow(names)
+    rows = 0
+    for chunk in chunks(statement, size):
+        values = [[plain(value) for value in row] for row in chunk]
+        if fmt == "csv":
+            writer.writerows(values)
+        else:
+            stream.writelines(json.dumps(dict(zip(names, row))) + "\n" for row in values)
+        rows += len(values)
+    return rows
+
+
+def arrow_schema(columns):
+    """Returns the Arrow schema of exported columns from their types, whatever values they hold"""
+    import pyarrow  # pylint: disable=import-outside-toplevel
+
+    fields = []
+    for column in columns:
+        if isinstance(column.type, db.Enum):
+            kind = pyarrow.string()
+        elif column.type.python_type is datetime.datetime:
+            kind = pyarrow.timestamp("us", tz="UTC" if column.type.timezone else None)
+        else:
+            kind = {int: pyarrow.int64(), str: pyarrow.string()}[column.type.python_type]
+        fields.append(pyarrow.field(column.name, kind))
+    return pyarrow.schema(fields)
+
+
+def write_columnar(statement, fmt: str, path: str, size: int) -> int:
+    """Writes the rows of a SELECT to a Parquet or Arrow file, returns the rows written"""
+    try:
+        # pylint: disable=import-outside-toplevel
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as error:
+        raise RuntimeError(f"The {fmt} format needs the pyarrow package") from error
+
+    schema = arrow_schema(statement.selected_columns)
+    if fmt == "parquet":
+        writer = pyarrow.parquet.ParquetWriter(path, schema)
+    else:
+        writer = pyarrow.ipc.new_file(path, schema)
+    rows = 0
+    with writer:
+        for chunk in chunks(statement, size):
+            columns = list(zip(*[[plain(v) if isinstance(v, enum.Enum) else v for v in row] for row in chunk]))
+            batch = pyarrow.record_batch(columns, schema=schema)
+            writer.write(batch)
+            rows += batch.num_rows
+    return rows
+
+
+######################################################################
+# Export
+######################################################################
+def export_table(statement, fmt: str, path: str, size: int = 10000) -> int:
+    """Writes a SELECT to a file in one of FORMATS and returns the rows written"""
+    if fmt in ("parquet", "arrow"):
+        return write_columnar(statement, fmt, path, size)
+    if db.engine.dialect.name == "postgresql":
+        with open(path, "wb") as stream:
+            return copy_to(statement, fmt, stream)
+    with open(path, "w", encoding="utf-8", newline="") as stream:
+        return write_rows(statement, fmt, stream, size)
+
+
+######################################################################
+# Import
+######################################################################
+def column_types(table: str) -> dict:
+    """Returns the function turning a file value into a value of each column of a table"""
+    types = {}
+    for column in db.metadata.tables[table].columns:
+        if isinstance(column.type, db.Enum):
+            types[column.name] = str
+        elif column.type.python_type is datetime.datetime:
+            types[column.name] = datetime.datetime.fromisoformat
+        else:
+            types[column.name] = column.type.python_type
+    return types
+
+
+def check_columns(table: str, names: list) -> None:
+    """Raises a ValueError when a file holds columns the table does not have"""
+    unknown = sorted(set(names) - set(db.metadata.tables[table].columns.keys()))
+    if unknown:
+        raise ValueError(f"Unknown columns for {table}: {', '.join(unknown)}")
+
+
+def read_rows(table: str, fmt: str, stream):
+    """Returns the columns of a CSV or NDJSON file and an iterator of its rows"""
+    if fmt == "csv":
+        lines = csv.reader(stream)
+        names = next(lines, [])
+    else:
+        documents = (json.loads(line) for line in stream if line.strip())
+        first = next(documents, None)
+        names = list(first or ())
+        lines = ([document.get(name) for name in names] for document in itertools.chain([first], documents) if document)
+    check_columns(table, names)
+    converters = [column_types(table)[name] for name in names]
+    rows = (
+        tuple(None if value in ("", None) else convert(value) for convert, value in zip(converters, line))
+        for line in lines
+    )
+    return names, rows
+
+
+def copy_csv(conn, table: str, stream) -> int:
+    """Streams a CSV file with a header into a table with COPY, returns the rows loaded"""
+    names = next(csv.reader([stream.readline()]), [])
+    check_columns(table, names)
+    if not names:
+        return 0
+    cursor = conn.connection.driver_connection.cursor()
+    statement = sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv)").format(
+        sql.Identifier(table), sql.SQL(", ").join(map(sql.Identifier, names))
+    )
+    with cursor.copy(statement) as copy:
+        while data := stream.read(COPY_BUFFER):
+            copy.write(data)
+    rows = cursor.rowcount
+    cursor.close()
+    return rows
+
+
+def load_rows(conn, table: str, names: list, rows, batch_size: int) -> int:
+    """Loads rows of values with COPY on Postgres or executemany() batches, returns the rows loaded"""
+    if not names:
+        return 0
+    if conn.dialect.name == "postgresql":
+        cursor = conn.connection.driver_connection.cursor()
+        statement = sql.SQL("COPY {} ({}) FROM STDIN").format(
+            sql.Identifier(table), sql.SQL(", ").join(map(sql.Identifier, names))
+        )
+        with cursor.copy(statement) as copy:
+            for row in rows:
+                copy.write_row(row)
+        count = cursor.rowcount
+        cursor.close()
+        return count
+    insert = db.metadata.tables[table].insert()
+    count = 0
+    while batch := list(itertools.islice(rows, batch_size)):
+        conn.execute(insert, [dict(zip(names, row)) for row in batch])
+        count += len(batch)
+    return count
+
+
+def reset_sequence(conn, table: str) -> None:
+    """Moves the id sequence of a table past the largest id, explicit ids do not advance it"""
+    if conn.dialect.name != "postgresql":
+        return
+    conn.execute(
+        db.text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE(MAX(id), 0) + 1, false) FROM {table}"
+        )
+    )
+
+
+@contextmanager
+def loading(tables: list, defer_indexes: bool = True):
+    """Yields a connection whose transaction loads the tables
+
+    The secondary indexes of the tables are dropped first and built again
+    once the rows are in, which is much faster than updating them row by
+    row. Postgres holds the tables locked until the commit, so use
+    defer_indexes=False to load into a database that is serving requests.
+    """
+    indexes = [index for table in tables for index in db.metadata.tables[table].indexes] if defer_indexes else []
+    with db.engine.begin() as conn:
+        for index in indexes:
+            index.drop(conn, checkfirst=True)
+        yield conn
+        for index in indexes:
+            index.create(conn, checkfirst=True)
+        for table in tables:
+            reset_sequence(conn, table)
+
+
+def import_file(table: str, fmt: str, path: str, batch_size: int = 10000, defer_indexes: bool = True) -> int:
+    """Loads a CSV or NDJSON file into a table and returns the rows loaded"""
+    with loading([table], defer_indexes) as conn, open(path, encoding="utf-8", newline="") as stream:
+        if fmt == "csv" and conn.dialect.name == "postgresql":
+            return copy_csv(conn, table, stream)
+        names, rows = read_rows(table, fmt, stream)
+        return load_rows(conn, table, names, rows, batch_size)
+
+
+######################################################################
+# Generated data
+######################################################################
+CART_NAMES = ["id", "user_id", "name", "total_price", "status"]
+ITEM_NAMES = ["id", "shop_cart_id", "name", "product_id", "quantity", "price"]
+
+
+def generate_chunks(count: int, items: int, size: int, first_ids=(1, 1), seed=None):
+    """Yields chunks of made-up (carts, items) rows, a column of a chunk at a time
+
+    Args:
+        count (int): the number of ShopCarts
+        items (int): the average number of Items of a ShopCart
+        size (int): the number of ShopCarts in a chunk
+        first_ids (tuple): the ids of the first ShopCart and the first Item
+        seed: seeds the random numbers to make the data repeatable
+    """
+    # pylint: disable=too-many-locals
+    rng = random.Random(seed)
+    statuses = [status.name for status in ShopCartStatus]
+    cart_id, item_id = first_ids
+    for start in range(0, count, size):
+        ids = range(cart_id + start, cart_id + min(start + size, count))
+        counts = rng.choices(range(2 * items + 1), k=len(ids))
+        owners = [owner for owner, many in zip(ids, counts) for _ in range(many)]
+        products = rng.choices(range(1, 10001), k=len(owners))
+        quantities = rng.choices(range(1, 6), k=len(owners))
+        prices = rng.choices(range(50, 20001), k=len(owners))
+        totals = dict.fromkeys(ids, 0)
+        for owner, quantity, price in zip(owners, quantities, prices):
+            totals[owner] += quantity * price
+        carts = list(
+            zip(
+                ids,
+                rng.choices(range(1, 1000001), k=len(ids)),
+                (f"cart-{number}" for number in ids),
+                totals.values(),
+                rng.choices(statuses, weights=(6, 1, 3), k=len(ids)),
+            )
+        )
+        item_ids = range(item_id, item_id + len(owners))
+        item_id += len(owners)
+        yield carts, list(zip(item_ids, owners, (f"item-{product}" for product in products), products, quantities, prices))
+
+
+def generate(count: int, items: int, size: int = 10000, seed=None, defer_indexes: bool = True) -> tuple:
+    """Loads made-up ShopCarts and Items after the existing ones, returns how many of each"""
+    loaded = [0, 0]
+    with loading(list(COLUMNS), defer_indexes) as conn:
+        first_ids = [
+            conn.scalar(db.select(db.func.coalesce(db.func.max(model.id), 0))) + 1 for model in (ShopCart, ShopCartItem)
+        ]
+        for carts, cart_items in generate_chunks(count, items, size, first_ids, seed):
+            loaded[0] += load_rows(conn, "shop_cart", CART_NAMES, iter(carts), size)
+            loaded[1] += load_rows(conn, "shop_cart_item", ITEM_NAMES, iter(cart_items), size)
+    return tuple(loaded)
@@ -16,14 +16,23 @@
 """
 Flask CLI Command Extensions
 """
+import os
+import time
+from datetime import timezone
+import click
 from flask import current_app as app  # Import Flask application
-from service.models import db
+from prometheus_client import start_http_server
+from service.models import db, SchemaVersion
+from service.models.shop_cart import ShopCartStatus
+from service.common import bulk, outbox
+from service.common.startup import BootProfile, export_spec, import_profile
 
 
 ######################################################################
 # Command to force tables to be rebuilt
 # Usage:
 #   flask db-create
+#   FLASK_APP="service:create_app(load_routes=False)" flask db-create
 ######################################################################
 @app.cli.command("db-create")
 def db_create():
@@ -34,3 +43,146 @@ def db_create():
     db.drop_all()
     db.create_all()
     db.session.commit()
+    SchemaVersion.stamp()
+
+
+######################################################################
+# Command to migrate the tables to the current schema version
+# Usage:
+#   FLASK_APP="service:create_app(load_routes=False)" flask db-upgrade
+######################################################################
+@app.cli.command("db-upgrade")
+def db_upgrade():
+    """Creates missing tables and runs the migrations the database lacks"""
+    db.create_all()
+    version = SchemaVersion.current()
+    SchemaVersion.upgrade(version or 1)
+    click.echo(f"Database upgraded from schema version {version} to {SchemaVersion.current()}")
+
+
+######################################################################
+# Command to write the Swagger spec to a file
+# Usage:
+#   flask swagger-export swagger.json
+#   SWAGGER_CACHE_FILE=swagger.json gunicorn ...
+######################################################################
+@app.cli.command("swagger-export")
+@click.argument("path")
+def swagger_export(path):
+    """Writes the Swagger spec so workers can load it instead of building it"""
+    from service import api  # pylint: disable=import-outside-toplevel
+
+    if api is None:
+        raise click.ClickException("The routes are not loaded, use FLASK_APP=wsgi:app")
+    export_spec(api, path)
+    click.echo(f"Swagger spec written to {path}")
+
+
+######################################################################
+# Command to show where worker startup time goes
+# Usage:
+#   flask startup-profile --top 20
+######################################################################
+@app.cli.command("startup-profile")
+@click.option("--top", default=20, help="Number of slowest imports to show")
+def startup_profile(top):
+    """Prints the slowest imports of a fresh interpreter and the create_app() phases"""
+    click.echo(f"{'cumulative ms':>14} {'self ms':>10}  module")
+    for cumulative, own, module in import_profile(top=top):
+        click.echo(f"{cumulative:14.1f} {own:10.1f}  {module}")
+    click.echo(f"create_app: {BootProfile.format(app.extensions['boot_profile'])}")
+
+
+######################################################################
+# Command to deliver the outbox events to the downstream services
+# Usage:
+#   FLASK_APP="service:create_app(load_routes=False)" flask outbox-dispatch --sink file:events.ndjson
+######################################################################
+@app.cli.command("outbox-dispatch")
+@click.option("--sink", default=None, help="stdout, file:<path> or an http(s) URL, OUTBOX_SINK by default")
+@click.option("--batch-size", default=None, type=int, help="Events per batch, OUTBOX_BATCH_SIZE by default")
+@click.option("--idle", default=None, type=float, help="Seconds to sleep when the outbox is empty")
+@click.option("--once", is_flag=True, help="Stop once the outbox is empty")
+@click.option("--metrics-port", default=0, help="Serve the Prometheus metrics on this port")
+def outbox_dispatch(sink, batch_size, idle, once, metrics_port):
+    """Drains the outbox in batches, several dispatchers may run at once"""
+    if metrics_port:
+        start_http_server(metrics_port)
+    target = outbox.make_sink(sink or app.config["OUTBOX_SINK"])
+    try:
+        sent = outbox.run(
+            target,
+            batch_size or app.config["OUTBOX_BATCH_SIZE"],
+            app.config["OUTBOX_IDLE_SECONDS"] if idle is None else idle,
+            once,
+        )
+    finally:
+        target.close()
+    click.echo(f"Dispatched {sent} outbox events", err=True)
+
+
+######################################################################
+# Command to dump the shopcarts for analytics
+# Usage:
+#   FLASK_APP="service:create_app(load_routes=False)" flask shopcarts-export --format csv --output exports
+######################################################################
+@app.cli.command("shopcarts-export")
+@click.option("--output", default=".", type=click.Path(file_okay=False), help="Directory to write the files to")
+@click.option("--format", "fmt", default="csv", type=click.Choice(bulk.FORMATS), help="File format")
+@click.option(
+    "--table", "tables", multiple=True, type=click.Choice(list(bulk.COLUMNS)), help="Table to export, all by default"
+)
+@click.option("--status", default=None, type=click.Choice([status.name for status in ShopCartStatus]))
+@click.option("--since", default=None, type=click.DateTime(), help="Only carts updated at or after this UTC time")
+@click.option("--until", default=None, type=click.DateTime(), help="Only carts updated before this UTC time")
+@click.option("--chunk-size", default=10000, help="Rows read at a time when COPY can not be used")
+def shopcarts_export(output, fmt, tables, status, since, until, chunk_size):
+    """Writes the shop_cart and shop_cart_item tables to files, one per table"""
+    # pylint: disable=too-many-arguments
+    os.makedirs(output, exist_ok=True)
+    since, until = (moment.replace(tzinfo=timezone.utc) if moment else None for moment in (since, until))
+    for table in tables or bulk.COLUMNS:
+        path = os.path.join(output, f"{table}.{fmt}")
+        start = time.monotonic()
+        try:
+            rows = bulk.export_table(bulk.export_query(table, status, since, until), fmt, path, chunk_size)
+        except RuntimeError as error:
+            raise click.ClickException(str(error)) from error
+        elapsed = time.monotonic() - start
+        size = os.path.getsize(path) / 1e6
+        speed = size / elapsed if elapsed else 0
+        click.echo(f"{table}: {rows} rows, {size:.1f} MB in {elapsed:.1f}s ({speed:.1f} MB/s) to {path}")
+
+
+######################################################################
+# Command to load shopcarts from files or made-up data
+# Usage:
+#   FLASK_APP="service:create_app(load_routes=False)" flask shopcarts-import --input exports
+#   FLASK_APP="service:create_app(load_routes=False)" flask shopcarts-import --generate 1000000
+######################################################################
+@app.cli.command("shopcarts-import")
+@click.option("--input", "source", default=".", type=click.Path(file_okay=False), help="Directory of the files")
+@click.option("--format", "fmt", default="csv", type=click.Choice(["csv", "ndjson"]), help="File format")
+@click.option("--generate", default=0, help="Make up this many carts instead of reading files")
+@click.option("--items", default=3, help="Average number of items of a generated cart")
+@click.option("--seed", default=None, type=int, help="Seed to make the generated data repeatable")
+@click.option("--batch-size", default=10000, help="Rows per chunk or executemany() batch")
+@click.option("--defer-indexes/--keep-indexes", default=True, help="Build the indexes once after the load")
+def shopcarts_import(source, fmt, generate, items, seed, batch_size, defer_indexes):
+    """Loads the shop_cart and shop_cart_item files shopcarts-export writes, or generated data"""
+    # pylint: disable=too-many-arguments
+    start = time.monotonic()
+    if generate:
+        carts, cart_items = bulk.generate(generate, items, batch_size, seed, defer_indexes)
+        click.echo(f"Generated {carts} carts and {cart_items} items in {time.monotonic() - start:.1f}s")
+        return
+    for table in bulk.COLUMNS:
+        path = os.path.join(source, f"{table}.{fmt}")
+        if not os.path.exists(path):
+            continue
+        try:
+            rows = bulk.import_file(table, fmt, path, batch_size, defer_indexes)
+        except ValueError as error:
+            raise click.ClickException(str(error)) from error
+        click.echo(f"{table}: {rows} rows in {time.monotonic() - start:.1f}s from {path}")
+        start = time.monotonic()
@@ -0,0 +1,162 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Request Coalescing
+
+Identical GET requests to the /api that arrive together wait for one of
+them and answer with the same body instead of running the same queries
+and serialization again (single-flight).
+
+Requests are identical when they have the same endpoint, path arguments
+and query arguments. Only successful responses are shared, with the
+headers of the view such as the Link of the next page; when the first
+request fails the waiters are served on their own.
+
+A request only joins a flight that has not started yet, so the response it
+gets was read after it arrived and reflects the writes the client made
+before. A request that finds a flight running queues the next one, and
+leads it once the running flight landed. Identical requests arriving
+meanwhile join the queued flight, so a key runs at most twice at a time.
+The write-behind buffer is flushed before a request joins a flight (see
+service/__init__.py).
+"""
+import threading
+from flask import g, request
+from service.common.metrics import record_cache
+
+# Headers describing how the leader was served rather than the response, the
+# waiters get their own
+PER_REQUEST_HEADERS = frozenset(("content-length", "date", "server-timing", "set-cookie", "x-query-count"))
+
+
+class Flight:  # pylint: disable=too-few-public-methods
+    """A request being served for everyone asking for the same thing"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+
+
+class SingleFlight:
+    """Tracks the GET requests in flight by key, and the next one queued behind each"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flights = {}
+        self.queued = {}
+
+    def join(self, key) -> tuple:
+        """Returns (flight, leader, running)
+
+        leader is True when the caller must serve the flight. A leader given a
+        running flight waits for it to land and then calls start().
+        """
+        with self.lock:
+            running = self.flights.get(key)
+            if running is None:
+                flight = self.flights[key] = Flight()
+                return flight, True, None
+            flight = self.queued.get(key)
+            if flight is not None:
+                return flight, False, None
+            flight = self.queued[key] = Flight()
+            return flight, True, running
+
+    def start(self, key, flight) -> None:
+        """Makes a queued flight the running one, later requests queue behind it"""
+        with self.lock:
+            if self.queued.get(key) is flight:
+                del self.queued[key]
+            self.flights[key] = flight
+
+    def enter(self, key, timeout: float) -> tuple:
+        """Returns (flight, leader), a queued leader returns once the running flight landed"""
+        flight, leader, running = self.join(key)
+        if running is not None:
+            running.done.wait(timeout)
+            self.start(key, flight)
+        return flight, leader
+
+    def land(self, key, flight, response) -> None:
+        """Shares the response of the leader with the waiters"""
+        with self.lock:
+            if self.flights.get(key) is flight:
+                del self.flights[key]
+        flight.response = response
+        flight.done.set()
+
+
+def request_key() -> tuple:
+    """Returns what makes a GET request identical to another one"""
+    return (
+        request.endpoint,
+        tuple(sorted((request.view_args or {}).items())),
+        tuple(sorted(request.args.items(multi=True))),
+    )
+
+
+def shareable(response):
+    """Returns (body, status, headers) of a response waiters may reuse"""
+    if response.status_code != 200 or response.direct_passthrough or response.is_streamed:
+        return None
+    headers = [(name, value) for name, value in response.headers if name.lower() not in PER_REQUEST_HEADERS]
+    return response.get_data(), response.status_code, headers
+
+
+######################################################################
+# Request hooks
+######################################################################
+def init_coalesce(app):
+    """Set up single-flight for the API reads"""
+    if not app.config["COALESCE_ENABLED"]:
+        return None
+    single_flight = SingleFlight()
+    app.extensions["coalesce"] = single_flight
+    timeout = app.config["COALESCE_TIMEOUT_MS"] / 1000
+
+    @app.before_request
+    def join_flight():  # pylint: disable=unused-variable
+        """Waits for an identical request in flight or leads a new one"""
+        if request.method != "GET" or not request.path.startswith("/api/"):
+            return None
+        key = request_key()
+        flight, leader = single_flight.enter(key, timeout)
+        record_cache("coalesce", not leader)
+        if leader:
+            g.coalesce_flight = key, flight
+            return None
+        if flight.done.wait(timeout) and flight.response is not None:
+            body, status_code, headers = flight.response
+            return app.response_class(body, status=status_code, headers=headers)
+        return None
+
+    @app.after_request
+    def share_response(response):  # pylint: disable=unused-variable
+        """Hands a successful response of the leader to the waiters"""
+        leading = g.pop("coalesce_flight", None)
+        if leading is not None:
+            single_flight.land(*leading, shareable(response))
+        return response
+
+    @app.teardown_request
+    def abandon_flight(exc):  # pylint: disable=unused-variable,unused-argument
+        """Releases the waiters when the leader failed before responding"""
+        leading = g.pop("coalesce_flight", None)
+        if leading is not None:
+            single_flight.land(*leading, None)
+
+    return single_flight
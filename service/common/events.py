@@ -0,0 +1,173 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Change Events
+
+Model writes queue a NOTIFY on EVENTS_CHANNEL that Postgres delivers when
+their transaction commits (see service/models/persistent_base.py). Each
+worker holds one LISTEN connection, opened with its first subscriber, and
+fans the notifications out to the Server-Sent Event streams of the
+shopcarts.
+
+Every stream holds a gunicorn thread, so a worker serves at most
+EVENTS_MAX_STREAMS of them and ends each one after EVENTS_STREAM_SECONDS.
+Browsers reconnect on their own.
+"""
+import json
+import time
+import queue
+import select
+import logging
+import threading
+import psycopg
+from psycopg import sql
+from service.common.metrics import EVENT_STREAMS
+from service.models import db
+
+logger = logging.getLogger("flask.app")
+
+# Events a slow stream may fall behind before new ones are dropped
+BACKLOG = 100
+
+
+class ChangeListener:
+    """One LISTEN connection shared by the event streams of a worker"""
+
+    def __init__(self, conninfo: str, channel: str, max_streams: int, poll: float = 1.0):
+        self.conninfo = conninfo
+        self.channel = channel
+        self.max_streams = max_streams
+        self.poll = poll
+        self.lock = threading.Lock()
+        self.subscribers = {}
+        self.streams = 0
+        self.thread = None
+        self.stopping = threading.Event()
+        self.listening = threading.Event()
+
+    def subscribe(self, shop_cart_id: int):
+        """Returns a queue of the events of a ShopCart, None when the worker is full"""
+        with self.lock:
+            if self.streams >= self.max_streams:
+                return None
+            events = queue.Queue(BACKLOG)
+            self.subscribers.setdefault(shop_cart_id, set()).add(events)
+            self.streams += 1
+            if self.thread is None or not self.thread.is_alive():
+                self.stopping.clear()
+                self.thread = threading.Thread(target=self.run, name="change-listener", daemon=True)
+                self.thread.start()
+        EVENT_STREAMS.inc()
+        return events
+
+    def unsubscribe(self, shop_cart_id: int, events) -> None:
+        """Stops delivering the events of a ShopCart to a queue"""
+        with self.lock:
+            subscribers = self.subscribers.get(shop_cart_id, set())
+            if events not in subscribers:
+                return
+            subscribers.discard(events)
+            if not subscribers:
+                del self.subscribers[shop_cart_id]
+            self.streams -= 1
+        EVENT_STREAMS.dec()
+
+    def publish(self, event: dict, shop_cart_id=None) -> None:
+        """Hands an event to the streams of its ShopCart, or to all of them"""
+        with self.lock:
+            if shop_cart_id is None:
+                targets = [events for subscribers in self.subscribers.values() for events in subscribers]
+            else:
+                targets = list(self.subscribers.get(shop_cart_id, ()))
+        for events in targets:
+            try:
+                events.put_nowait(event)
+            except queue.Full:
+                logger.warning("Dropping a change event for a slow stream")
+
+    def dispatch(self, payload: str) -> None:
+        """Publishes a notification received on the channel"""
+        event = json.loads(payload)
+        self.publish(event, event.get("shop_cart_id"))
+
+    def run(self) -> None:
+        """Listens until stopped, reconnecting after errors"""
+        while not self.stopping.is_set():
+            try:
+                self.listen()
+            except psycopg.Error as error:
+                self.listening.clear()
+                logger.warning("Change listener disconnected: %s", error)
+                # Changes may have been missed, the streams should reload
+                self.publish({"action": "resync"})
+                self.stopping.wait(self.poll)
+
+    def listen(self) -> None:
+        """Waits for notifications on one connection"""
+        with psycopg.connect(self.conninfo, autocommit=True) as conn:
+            conn.execute(sql.SQL("LISTEN {}").format(sql.Identifier(self.channel)))
+            logger.info("Listening for changes on %s", self.channel)
+            self.listening.set()
+            while not self.stopping.is_set():
+                if not select.select([conn.fileno()], [], [], self.poll)[0]:
+                    continue
+                conn.pgconn.consume_input()
+                notify = conn.pgconn.notifies()
+                while notify is not None:
+                    self.dispatch(notify.extra.decode())
+                    notify = conn.pgconn.notifies()
+
+    def stop(self) -> None:
+        """Stops listening"""
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join(self.poll * 2)
+        self.listening.clear()
+
+
+def event_stream(events, heartbeat: float, lifetime: float):
+    """Yields the events of a queue as text/event-stream until the lifetime ends"""
+    yield f"retry: {int(heartbeat * 1000)}\n\n"
+    deadline = time.monotonic() + lifetime
+    while (time_left := deadline - time.monotonic()) > 0:
+        try:
+            event = events.get(timeout=min(heartbeat, time_left))
+        except queue.Empty:
+            yield ": keepalive\n\n"
+            continue
+        yield f"event: {event['action']}\ndata: {json.dumps(event)}\n\n"
+
+
+def get_listener(app):
+    """Returns the change listener of the app, None when events are disabled"""
+    return app.extensions.get("events")
+
+
+def init_events(app):
+    """Set up the change listener behind the event streams"""
+    if not app.config["EVENTS_ENABLED"]:
+        return None
+    url = db.engine.url
+    if url.get_backend_name() != "postgresql":
+        return None
+    listener = ChangeListener(
+        url.set(drivername="postgresql").render_as_string(hide_password=False),
+        app.config["EVENTS_CHANNEL"],
+        app.config["EVENTS_MAX_STREAMS"],
+    )
+    app.extensions["events"] = listener
+    return listener
@@ -0,0 +1,86 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Readiness Check
+
+Answers /health/ready from a cached result so that probes from kubelets,
+load balancers and dashboards reach Postgres at most once every
+READINESS_CACHE_SECONDS per worker. The check fails without touching the
+database when the connection pool has no connection left to hand out. A
+pool with max_overflow -1 opens connections without limit and is never
+exhausted; its utilization is reported against pool_size.
+"""
+import time
+import threading
+from sqlalchemy import text
+from service.models import db
+
+
+class ReadinessCheck:
+    """Runs SELECT 1 and a pool saturation check, caching the result"""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.result = None
+        self.expires = 0.0
+
+    def get(self) -> tuple:
+        """Returns (ready, details), running the check when the cache expired"""
+        with self.lock:
+            if self.result is None or time.monotonic() >= self.expires:
+                self.result = self.run()
+                self.expires = time.monotonic() + self.ttl
+            return self.result
+
+    @staticmethod
+    def run() -> tuple:
+        """Checks the pool and the database"""
+        pool = db.engine.pool
+        max_overflow = getattr(pool, "_max_overflow", 0)
+        capacity = None if max_overflow < 0 else pool.size() + max_overflow
+        checked_out = pool.checkedout()
+        limit = capacity or pool.size()
+        details = {
+            "pool": {
+                "size": pool.size(),
+                "checked_out": checked_out,
+                "capacity": capacity,
+                "utilization": round(checked_out / limit, 2) if limit else None,
+            },
+        }
+        if capacity is not None and checked_out >= capacity:
+            details["database"] = "pool exhausted"
+            return False, details
+        try:
+            with db.engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+        except Exception as error:  # pylint: disable=broad-except
+            details["database"] = type(error).__name__
+            return False, details
+        details["database"] = "OK"
+        return True, details
+
+
+def get_readiness(app) -> ReadinessCheck:
+    """Returns the readiness check of the app"""
+    return app.extensions["readiness"]
+
+
+def init_health(app):
+    """Set up the cached readiness check"""
+    app.extensions["readiness"] = ReadinessCheck(app.config["READINESS_CACHE_SECONDS"])
@@ -19,18 +19,136 @@ Log Handlers
 
 This module contains utility functions to set up logging
 consistently
+
+Records from the app logger and the model logger ("flask.app") are sampled,
+put on a bounded queue and written as JSON lines by a background listener.
+A full queue drops records instead of blocking the request, and counts
+them in the shopcarts_log_records_dropped_total metric.
 """
+import json
+import queue
+import atexit
+import random
 import logging
+from logging.handlers import QueueHandler, QueueListener
+from service.common.metrics import LOG_RECORDS_DROPPED
+
+# Logger used by the models in service/models
+MODEL_LOGGER = "flask.app"
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as one JSON object per line"""
+
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record, self.datefmt),
+            "level": record.levelname,
+            "logger": record.name,
+            "module": record.module,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a fraction of the INFO and DEBUG records of each logger
+
+    Warnings and errors are always kept.
+    """
+
+    def __init__(self, rates: dict):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates.get(record.name, 1.0)
+        return rate >= 1.0 or random.random() < rate
+
+
+class DroppingQueueHandler(QueueHandler):
+    """Queues records without blocking, counting the ones that do not fit"""
+
+    def __init__(self, maxsize: int):
+        super().__init__(queue.Queue(maxsize))
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            LOG_RECORDS_DROPPED.inc()
+
+
+def parse_sample_rates(text: str) -> dict:
+    """Parses "logger=rate,logger=rate" into a dictionary"""
+    rates = {}
+    for pair in filter(None, (part.strip() for part in text.split(","))):
+        name, rate = pair.rsplit("=", 1)
+        rates[name.strip()] = float(rate)
+    return rates
+
+
+def stop_listener(listener: QueueListener) -> None:
+    """Writes out the queued records and stops the listener thread"""
+    if listener._thread is not None:
+        listener.stop()
+
+
+def restart_listener(app) -> None:
+    """Starts a new listener thread in a forked gunicorn worker
+
+    Threads do not survive fork(), so the worker gets an empty queue and its
+    own listener writing to the same handlers.
+    """
+    listener = app.extensions.get("log_listener")
+    if listener is None:
+        return
+    queue_handler = app.extensions["log_queue"]
+    queue_handler.queue = queue.Queue(queue_handler.queue.maxsize)
+    listener = QueueListener(
+        queue_handler.queue, *listener.handlers, respect_handler_level=True
+    )
+    listener.start()
+    atexit.register(stop_listener, listener)
+    app.extensions["log_listener"] = listener
 
 
 def init_logging(app, logger_name: str):
     """Set up logging for production"""
     app.logger.propagate = False
     gunicorn_logger = logging.getLogger(logger_name)
-    app.logger.handlers = gunicorn_logger.handlers
+    handlers = gunicorn_logger.handlers
     app.logger.setLevel(gunicorn_logger.level)
     # Make all log formats consistent
-    formatter = logging.Formatter("[%(asctime)s] [%(levelname)s] [%(module)s] %(message)s", "%Y-%m-%d %H:%M:%S %z")
-    for handler in app.logger.handlers:
+    if app.config.get("LOG_FORMAT", "text") == "json":
+        formatter = JsonFormatter(datefmt="%Y-%m-%dT%H:%M:%S%z")
+    else:
+        formatter = logging.Formatter("[%(asctime)s] [%(levelname)s] [%(module)s] %(message)s", "%Y-%m-%d %H:%M:%S %z")
+    for handler in handlers:
         handler.setFormatter(formatter)
+
+    if app.config.get("LOG_ASYNC"):
+        queue_handler = DroppingQueueHandler(app.config["LOG_QUEUE_SIZE"])
+        listener = QueueListener(
+            queue_handler.queue, *handlers, respect_handler_level=True
+        )
+        listener.start()
+        atexit.register(stop_listener, listener)
+        app.extensions["log_listener"] = listener
+        app.extensions["log_queue"] = queue_handler
+        handlers = [queue_handler]
+
+    sampler = SamplingFilter(parse_sample_rates(app.config.get("LOG_SAMPLE_RATES", "")))
+    model_logger = logging.getLogger(MODEL_LOGGER)
+    model_logger.propagate = False
+    model_logger.setLevel(gunicorn_logger.level)
+    for logger in (app.logger, model_logger):
+        logger.handlers = handlers
+        logger.filters = [sampler]
     app.logger.info("Logging handler established")
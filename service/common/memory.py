@@ -0,0 +1,117 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Memory Watchdog
+
+Reads the resident set size of the worker before and after every request,
+records the peak RSS and the growth of each route as Prometheus gauges,
+and asks the worker to recycle once RSS stays over MEMORY_SOFT_LIMIT_MB.
+A worker over the limit runs a full garbage collection first, at most once
+every MEMORY_GC_INTERVAL_SECONDS; over the limit again within that time it
+recycles without collecting.
+
+The recycle itself happens in the gunicorn post_request hook, which stops
+the worker after the response has been sent, the same way max_requests
+does, so in-flight requests are not killed by the OOM killer.
+"""
+import gc
+import os
+import sys
+import time
+import resource
+from flask import g, request
+from service.common.metrics import RSS, ROUTE_PEAK_RSS, ROUTE_RSS_GROWTH
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+def rss_bytes() -> int:
+    """Returns the current resident set size of this process"""
+    try:
+        with open("/proc/self/statm", encoding="ascii") as file:
+            return int(file.read().split()[1]) * PAGE_SIZE
+    except OSError:
+        # No procfs (macOS, or Linux without /proc): fall back to the peak RSS,
+        # which getrusage() gives in bytes on macOS and in kilobytes on Linux
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak * 1024 if sys.platform.startswith("linux") else peak
+
+
+class MemoryWatchdog:
+    """Tracks RSS per route and decides when the worker should recycle"""
+
+    def __init__(self, app, soft_limit_mb: int, gc_interval: float = 60.0):
+        self.app = app
+        self.soft_limit = soft_limit_mb * 1024 * 1024
+        self.gc_interval = gc_interval
+        self.last_collect = float("-inf")
+        self.recycle = False
+        self.peak_rss = {}
+        self.peak_growth = {}
+
+    def check(self, endpoint: str, start_rss: int) -> int:
+        """Records the RSS after a request and flags the worker when over the limit"""
+        rss = rss_bytes()
+        RSS.set(rss)
+        peak = self.peak_rss[endpoint] = max(rss, self.peak_rss.get(endpoint, 0))
+        growth = self.peak_growth[endpoint] = max(rss - start_rss, self.peak_growth.get(endpoint, 0))
+        ROUTE_PEAK_RSS.labels(endpoint).set(peak)
+        ROUTE_RSS_GROWTH.labels(endpoint).set(growth)
+        if self.soft_limit and rss > self.soft_limit and not self.recycle:
+            # Give the collector a chance before giving up on the worker,
+            # a full collection pauses every request of the worker
+            now = time.monotonic()
+            if now - self.last_collect >= self.gc_interval:
+                self.last_collect = now
+                gc.collect()
+                rss = rss_bytes()
+            if rss > self.soft_limit:
+                self.recycle = True
+                self.app.logger.warning(
+                    "Worker RSS %.1f MiB is over the %.1f MiB soft limit after %s, recycling",
+                    rss / 2**20,
+                    self.soft_limit / 2**20,
+                    endpoint,
+                )
+        return rss
+
+
+def get_watchdog(app) -> MemoryWatchdog:
+    """Returns the memory watchdog of the app"""
+    return app.extensions["memory_watchdog"]
+
+
+def init_memory_watchdog(app):
+    """Set up the RSS checks around every request"""
+    watchdog = MemoryWatchdog(
+        app, app.config["MEMORY_SOFT_LIMIT_MB"], app.config["MEMORY_GC_INTERVAL_SECONDS"]
+    )
+    app.extensions["memory_watchdog"] = watchdog
+
+    @app.before_request
+    def start_memory_check():  # pylint: disable=unused-variable
+        """Remembers the RSS before the request"""
+        g.start_rss = rss_bytes()
+
+    @app.after_request
+    def finish_memory_check(response):  # pylint: disable=unused-variable
+        """Records the RSS after the request"""
+        if "start_rss" in g:
+            watchdog.check(request.endpoint or "none", g.start_rss)
+        return response
+
+    return watchdog
@@ -0,0 +1,184 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Prometheus Metrics
+
+Records request counts, latency histograms and in-flight requests per
+flask-restx resource and method, database pool usage, worker memory
+(see service/common/memory.py), cache hits, failed write-behind flushes
+and the log records dropped by a full log queue (see
+service/common/log_handlers.py).
+
+When PROMETHEUS_MULTIPROC_DIR is set every gunicorn worker writes its
+samples to that shared directory and /metrics aggregates all of them.
+The directory must be empty when the server starts.
+"""
+import os
+import time
+from flask import g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+from service.models import db
+
+REQUESTS = Counter(
+    "shopcarts_http_requests_total",
+    "HTTP requests served",
+    ["endpoint", "method", "status"],
+)
+LATENCY = Histogram(
+    "shopcarts_http_request_duration_seconds",
+    "HTTP request latency",
+    ["endpoint", "method"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+IN_PROGRESS = Gauge(
+    "shopcarts_http_requests_in_progress",
+    "HTTP requests being served",
+    multiprocess_mode="livesum",
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "shopcarts_db_pool_checked_out",
+    "Database connections checked out of the pool",
+    multiprocess_mode="livesum",
+)
+DB_POOL_SIZE = Gauge(
+    "shopcarts_db_pool_size",
+    "Database connections held by the pool",
+    multiprocess_mode="livesum",
+)
+RSS = Gauge(
+    "shopcarts_worker_rss_bytes",
+    "Resident set size of the worker after its last request",
+    multiprocess_mode="liveall",
+)
+ROUTE_PEAK_RSS = Gauge(
+    "shopcarts_route_peak_rss_bytes",
+    "Largest worker RSS seen after a request to the route",
+    ["endpoint"],
+    multiprocess_mode="max",
+)
+ROUTE_RSS_GROWTH = Gauge(
+    "shopcarts_route_rss_growth_bytes",
+    "Largest RSS growth during one request to the route",
+    ["endpoint"],
+    multiprocess_mode="max",
+)
+ADMISSION_REJECTED = Counter(
+    "shopcarts_admission_rejected_total",
+    "Requests shed by admission control",
+    ["endpoint", "reason"],
+)
+EVENT_STREAMS = Gauge(
+    "shopcarts_event_streams",
+    "Server-Sent Event streams open",
+    multiprocess_mode="livesum",
+)
+OUTBOX_DISPATCHED = Counter(
+    "shopcarts_outbox_dispatched_total",
+    "Outbox events handed to the sink",
+    ["sink"],
+)
+OUTBOX_LAG = Histogram(
+    "shopcarts_outbox_lag_seconds",
+    "Time from an outbox event commit to its dispatch",
+    ["sink"],
+    buckets=(0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0),
+)
+WRITE_BEHIND_FLUSH_ERRORS = Counter(
+    "shopcarts_write_behind_flush_errors_total",
+    "Write-behind flushes that failed and were kept for the next flush",
+)
+LOG_RECORDS_DROPPED = Counter(
+    "shopcarts_log_records_dropped_total",
+    "Log records dropped because the log queue was full",
+)
+CACHE_REQUESTS = Counter(
+    "shopcarts_cache_requests_total",
+    "Cache lookups by result",
+    ["cache", "result"],
+)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    """Counts a cache lookup as a hit or a miss"""
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def render() -> tuple:
+    """Returns the metrics page and its content type"""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+######################################################################
+# Database pool events
+######################################################################
+def on_checkout(*args):  # pylint: disable=unused-argument
+    """Counts a connection handed out by the pool"""
+    DB_POOL_CHECKED_OUT.inc()
+
+
+def on_checkin(*args):  # pylint: disable=unused-argument
+    """Counts a connection returned to the pool"""
+    DB_POOL_CHECKED_OUT.dec()
+
+
+######################################################################
+# Request hooks
+######################################################################
+def init_metrics(app):
+    """Set up the request and pool instrumentation"""
+    event.listen(db.engine, "checkout", on_checkout)
+    event.listen(db.engine, "checkin", on_checkin)
+
+    @app.before_request
+    def start_metrics():  # pylint: disable=unused-variable
+        """Marks the request as in flight"""
+        g.metrics_start = time.perf_counter()
+        IN_PROGRESS.inc()
+
+    @app.after_request
+    def record_metrics(response):  # pylint: disable=unused-variable
+        """Records the latency and status of the request"""
+        endpoint = request.endpoint or "none"
+        LATENCY.labels(endpoint, request.method).observe(
+            time.perf_counter() - g.metrics_start
+        )
+        REQUESTS.labels(endpoint, request.method, response.status_code).inc()
+        return response
+
+    @app.teardown_request
+    def finish_metrics(exc):  # pylint: disable=unused-variable,unused-argument
+        """Ends the in flight request and samples the pool size"""
+        if "metrics_start" not in g:
+            return
+        IN_PROGRESS.dec()
+        pool = db.engine.pool
+        DB_POOL_SIZE.set(pool.checkedin() + pool.checkedout())
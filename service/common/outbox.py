@@ -0,0 +1,160 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Outbox Dispatcher
+
+Drains the outbox table (see service/models/outbox_event.py) in batches
+and hands each batch to a sink. A batch is claimed with SELECT ... FOR
+UPDATE SKIP LOCKED and deleted in the same transaction once the sink took
+it, so several dispatchers can run side by side without sending an event
+twice. An event whose batch failed is sent again, delivery is at least
+once: consumers should skip event ids they have already seen.
+
+OUTBOX_SINK names where the batches go:
+
+    stdout              one JSON line per event
+    file:<path>         one JSON line per event appended to the file
+    http(s)://<url>     a POST of the batch as a JSON array
+"""
+import sys
+import json
+import time
+import logging
+import urllib.request
+from datetime import datetime, timezone
+from service.common.metrics import OUTBOX_DISPATCHED, OUTBOX_LAG
+from service.models import db, OutboxEvent
+
+logger = logging.getLogger("flask.app")
+
+
+######################################################################
+# Sinks
+######################################################################
+class StreamSink:
+    """Writes every event as a JSON line to a text stream"""
+
+    name = "stdout"
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def send(self, messages: list) -> None:
+        """Writes a batch of messages"""
+        self.stream.write("".join(json.dumps(message) + "\n" for message in messages))
+        self.stream.flush()
+
+    def close(self) -> None:
+        """Releases the sink"""
+
+
+class FileSink(StreamSink):
+    """Appends every event as a JSON line to a file"""
+
+    name = "file"
+
+    def __init__(self, path: str):
+        super().__init__(open(path, "a", encoding="utf-8"))  # pylint: disable=consider-using-with
+
+    def close(self) -> None:
+        """Closes the file"""
+        self.stream.close()
+
+
+class HttpSink:
+    """POSTs every batch as a JSON array, a stand-in for a message broker"""
+
+    name = "http"
+
+    def __init__(self, url: str, timeout: float = 10.0):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, messages: list) -> None:
+        """POSTs a batch of messages, any answer but 2xx fails the batch"""
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(messages).encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+    def close(self) -> None:
+        """Releases the sink"""
+
+
+def make_sink(spec: str):
+    """Creates the sink named by OUTBOX_SINK"""
+    if spec == "stdout":
+        return StreamSink(sys.stdout)
+    if spec.startswith("file:"):
+        return FileSink(spec[len("file:"):])
+    if spec.startswith(("http://", "https://")):
+        return HttpSink(spec)
+    raise ValueError(f"Unknown OUTBOX_SINK '{spec}'")
+
+
+######################################################################
+# Dispatching
+######################################################################
+def dispatch_batch(sink, limit: int) -> int:
+    """Sends one batch of the oldest unclaimed events and returns its size"""
+    try:
+        events = OutboxEvent.claim(limit)
+        if not events:
+            db.session.rollback()
+            return 0
+        sink.send([event.serialize() for event in events])
+        created = [event.created_at for event in events]
+        OutboxEvent.remove([event.id for event in events])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    now = datetime.now(timezone.utc)
+    for created_at in created:
+        OUTBOX_LAG.labels(sink.name).observe((now - created_at).total_seconds())
+    OUTBOX_DISPATCHED.labels(sink.name).inc(len(created))
+    return len(created)
+
+
+def run(sink, limit: int, idle: float, once: bool = False) -> int:
+    """Dispatches until stopped, or until the outbox is empty when once is set
+
+    Returns the number of events sent.
+    """
+    sent = 0
+    start = time.monotonic()
+    while True:
+        try:
+            count = dispatch_batch(sink, limit)
+        except Exception as error:  # pylint: disable=broad-except
+            if once:
+                raise
+            logger.error("Outbox batch failed, retrying: %s", error)
+            count = 0
+        sent += count
+        if count == limit:
+            continue
+        if once:
+            break
+        time.sleep(idle)
+    elapsed = time.monotonic() - start
+    logger.info("Dispatched %d outbox events in %.1fs (%.0f/s)", sent, elapsed, sent / elapsed if elapsed else 0)
+    return sent
@@ -0,0 +1,209 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Rate Limiting
+
+Token buckets per shopcart or user for the routes that write to the
+database. A request that finds its bucket empty is answered with 429 and
+a Retry-After header before it reaches a resource or the database.
+
+RATE_LIMITS lists the buckets of each route group as
+"group=burst:refill per second". The buckets are kept in RATE_LIMIT_STORE:
+
+    memory            a dictionary in each worker
+    shared            shared memory inherited by the gunicorn workers,
+                      which needs GUNICORN_PRELOAD
+    redis://host/0    a Redis compatible server, the client is in the redis extra
+"""
+import math
+import mmap
+import time
+import struct
+import hashlib
+import threading
+import multiprocessing
+from flask import request
+from service.common import status
+
+# Route groups by (method, endpoint)
+ROUTE_GROUPS = {
+    ("POST", "item_collection"): "item_write",
+    ("PUT", "item_resource"): "item_write",
+    ("DELETE", "item_resource"): "item_write",
+    ("POST", "shopcart_collection"): "cart_write",
+    ("PUT", "shopcart_resource"): "cart_write",
+    ("DELETE", "shopcart_resource"): "cart_write",
+    ("PATCH", "update_status_resource"): "cart_write",
+}
+
+
+def parse_limits(text: str) -> dict:
+    """Parses "group=burst:rate,group=burst:rate" into {group: (burst, rate)}"""
+    limits = {}
+    for pair in filter(None, (part.strip() for part in text.split(","))):
+        group, bucket = pair.split("=", 1)
+        burst, rate = bucket.split(":", 1)
+        limits[group.strip()] = (float(burst), float(rate))
+    return limits
+
+
+def refill(tokens: float, updated: float, now: float, burst: float, rate: float) -> tuple:
+    """Takes one token from a bucket
+
+    Returns the tokens left and how many seconds to wait when the bucket is
+    empty (0 when the request is allowed).
+    """
+    tokens = min(burst, tokens + (now - updated) * rate)
+    if tokens >= 1:
+        return tokens - 1, 0.0
+    return tokens, (1 - tokens) / rate
+
+
+######################################################################
+# Bucket stores
+######################################################################
+class MemoryStore:
+    """Buckets in a dictionary of this worker"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = {}
+
+    def take(self, key: str, burst: float, rate: float) -> float:
+        """Takes a token and returns the seconds to wait, 0 when allowed"""
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated = self.buckets.get(key, (burst, now))
+            tokens, wait = refill(tokens, updated, now, burst, rate)
+            self.buckets[key] = (tokens, now)
+        return wait
+
+
+class SharedMemoryStore:
+    """Buckets in an anonymous shared mapping inherited across fork()
+
+    Keys are hashed into a fixed number of slots. A key that lands on a
+    slot held by another key takes it over with a full bucket.
+    """
+
+    SLOT = struct.Struct("Qdd")  # key hash, tokens, updated
+
+    def __init__(self, slots: int):
+        self.slots = slots
+        self.memory = mmap.mmap(-1, slots * self.SLOT.size)
+        self.lock = multiprocessing.Lock()
+
+    def take(self, key: str, burst: float, rate: float) -> float:
+        """Takes a token and returns the seconds to wait, 0 when allowed"""
+        digest = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+        offset = (digest % self.slots) * self.SLOT.size
+        # CLOCK_MONOTONIC is shared by all processes on the host
+        now = time.monotonic()
+        with self.lock:
+            owner, tokens, updated = self.SLOT.unpack_from(self.memory, offset)
+            if owner != digest:
+                tokens, updated = burst, now
+            tokens, wait = refill(tokens, updated, now, burst, rate)
+            self.SLOT.pack_into(self.memory, offset, digest, tokens, now)
+        return wait
+
+
+class RedisStore:
+    """Buckets in a Redis compatible server shared by every pod"""
+
+    SCRIPT = """
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local burst, rate, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local tokens = tonumber(bucket[1]) or burst
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', math.max(now, updated))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return tostring(wait)
+"""
+
+    def __init__(self, url: str):
+        import redis  # pylint: disable=import-outside-toplevel,import-error
+
+        self.client = redis.Redis.from_url(url)
+        self.script = self.client.register_script(self.SCRIPT)
+
+    def take(self, key: str, burst: float, rate: float) -> float:
+        """Takes a token and returns the seconds to wait, 0 when allowed"""
+        # Wall clock time, since the buckets are shared between hosts
+        return float(self.script(keys=[f"ratelimit:{key}"], args=[burst, rate, time.time()]))
+
+
+def make_store(app):
+    """Creates the bucket store named by RATE_LIMIT_STORE"""
+    name = app.config["RATE_LIMIT_STORE"]
+    if name == "memory":
+        return MemoryStore()
+    if name == "shared":
+        return SharedMemoryStore(app.config["RATE_LIMIT_SHARED_SLOTS"])
+    if name.startswith(("redis://", "rediss://", "unix://")):
+        return RedisStore(name)
+    raise ValueError(f"Unknown RATE_LIMIT_STORE '{name}'")
+
+
+######################################################################
+# Request hooks
+######################################################################
+def client_key() -> str:
+    """Returns the shopcart, user or address the request is counted against"""
+    view_args = request.view_args or {}
+    if "shopcart_id" in view_args:
+        return f"cart:{view_args['shopcart_id']}"
+    body = request.get_json(silent=True)
+    if isinstance(body, dict) and "user_id" in body:
+        return f"user:{body['user_id']}"
+    return f"addr:{request.remote_addr}"
+
+
+def init_rate_limit(app):
+    """Set up the token buckets in front of the write routes"""
+    if not app.config["RATE_LIMIT_ENABLED"]:
+        return None
+    limits = parse_limits(app.config["RATE_LIMITS"])
+    store = make_store(app)
+    app.extensions["rate_limit"] = store
+
+    @app.before_request
+    def check_rate_limit():  # pylint: disable=unused-variable
+        """Answers 429 when the bucket of the client is empty"""
+        group = ROUTE_GROUPS.get((request.method, request.endpoint))
+        if group not in limits:
+            return None
+        burst, rate = limits[group]
+        key = client_key()
+        wait = store.take(f"{group}:{key}", burst, rate)
+        if not wait:
+            return None
+        app.logger.warning("Rate limited %s on %s", key, group)
+        return (
+            {
+                "status_code": status.HTTP_429_TOO_MANY_REQUESTS,
+                "error": "Too Many Requests",
+                "message": f"Rate limit for {group} exceeded, retry in {wait:.1f} seconds",
+            },
+            status.HTTP_429_TOO_MANY_REQUESTS,
+            {"Retry-After": str(math.ceil(wait))},
+        )
+
+    return store
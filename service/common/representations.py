@@ -0,0 +1,91 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+JSON Representation
+
+Encodes the application/json responses of the API straight to bytes.
+JSON_ENCODER picks the encoder: orjson, several times faster than the
+json module on large cart listings, or stdlib. Where orjson cannot be
+installed, e.g. on a platform it has no wheel for, the json module is used.
+
+Both encoders write Decimals as numbers, enums as their values and
+datetimes in ISO 8601, so a response does not depend on which one ran.
+"""
+import json
+import enum
+import datetime
+from decimal import Decimal
+from flask import current_app, make_response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # pylint: disable=invalid-name
+
+
+def default(value):
+    """Encodes the values neither encoder knows"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, enum.Enum):
+        return value.value
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def orjson_dumps(data, pretty: bool = False) -> bytes:
+    """Encodes JSON with orjson"""
+    option = orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE
+    if pretty:
+        option |= orjson.OPT_INDENT_2
+    return orjson.dumps(data, default=default, option=option)
+
+
+def stdlib_dumps(data, pretty: bool = False) -> bytes:
+    """Encodes JSON with the json module"""
+    text = json.dumps(
+        data,
+        default=default,
+        ensure_ascii=False,
+        indent=2 if pretty else None,
+        separators=None if pretty else (",", ":"),
+    )
+    return (text + "\n").encode()
+
+
+ENCODERS = {"orjson": orjson_dumps, "stdlib": stdlib_dumps}
+
+
+def output_json(data, code, headers=None):
+    """Makes a JSON response whose body is the encoded bytes"""
+    dumps = current_app.extensions.get("json_dumps", stdlib_dumps)
+    response = make_response(dumps(data, current_app.debug), code)
+    response.headers.extend(headers or {})
+    return response
+
+
+def init_representations(app):
+    """Set up the JSON encoder of the API responses"""
+    name = app.config["JSON_ENCODER"]
+    if name not in ENCODERS:
+        raise RuntimeError(f"Unknown JSON_ENCODER '{name}'")
+    if name == "orjson" and orjson is None:
+        app.logger.warning("orjson is not installed, encoding JSON with the json module")
+        name = "stdlib"
+    app.extensions["json_dumps"] = ENCODERS[name]
+    return name
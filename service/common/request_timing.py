@@ -0,0 +1,136 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Request Timing
+
+Counts the SQL statements and database time of every request through
+SQLAlchemy engine events, and the time spent encoding the response body.
+The numbers are returned as Server-Timing and X-Query-Count headers when
+REQUEST_TIMING_HEADERS is set, and requests over QUERY_COUNT_BUDGET or
+REQUEST_DURATION_BUDGET_MS are logged.
+"""
+import time
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from service import api
+from service.common.representations import output_json
+from service.models import db
+
+
+class RequestTiming:  # pylint: disable=too-few-public-methods
+    """Timings collected while serving one request"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.db_count = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+
+    def header(self, total: float) -> str:
+        """Formats the timings as a Server-Timing header value"""
+        return (
+            f"db;dur={self.db_time * 1000:.2f}, "
+            f'db-count;desc="{self.db_count}", '
+            f"serialize;dur={self.serialize_time * 1000:.2f}, "
+            f"total;dur={total * 1000:.2f}"
+        )
+
+
+def current_timing():
+    """Returns the timings of the current request or None"""
+    if has_request_context():
+        return g.get("request_timing")
+    return None
+
+
+######################################################################
+# SQLAlchemy engine events
+######################################################################
+def before_cursor_execute(conn, *args):  # pylint: disable=unused-argument
+    """Remembers when a statement was sent"""
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, *args):  # pylint: disable=unused-argument
+    """Adds a finished statement to the current request"""
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    timing = current_timing()
+    if timing is not None:
+        timing.db_count += 1
+        timing.db_time += elapsed
+
+
+def handle_error(context):
+    """Adds a statement that failed to the current request"""
+    conn = context.connection
+    if conn is not None and context.statement is not None and conn.info.get("query_start"):
+        after_cursor_execute(conn)
+
+
+######################################################################
+# Response encoding
+######################################################################
+@api.representation("application/json")
+def timed_output_json(data, code, headers=None):
+    """Encodes a JSON response and records the time it took"""
+    start = time.perf_counter()
+    resp = output_json(data, code, headers)
+    timing = current_timing()
+    if timing is not None:
+        timing.serialize_time += time.perf_counter() - start
+    return resp
+
+
+######################################################################
+# Request hooks
+######################################################################
+def init_request_timing(app):
+    """Set up SQL counting and the timing headers"""
+    event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(db.engine, "after_cursor_execute", after_cursor_execute)
+    event.listen(db.engine, "handle_error", handle_error)
+
+    @app.before_request
+    def start_request_timing():  # pylint: disable=unused-variable
+        """Starts collecting timings for the request"""
+        g.request_timing = RequestTiming()
+
+    @app.after_request
+    def finish_request_timing(response):  # pylint: disable=unused-variable
+        """Adds the timing headers and logs requests over budget"""
+        timing = current_timing()
+        if timing is None:
+            return response
+        total = time.perf_counter() - timing.start
+        if app.config["REQUEST_TIMING_HEADERS"]:
+            response.headers["Server-Timing"] = timing.header(total)
+            response.headers["X-Query-Count"] = str(timing.db_count)
+
+        query_budget = app.config["QUERY_COUNT_BUDGET"]
+        duration_budget = app.config["REQUEST_DURATION_BUDGET_MS"]
+        if (query_budget and timing.db_count > query_budget) or (
+            duration_budget and total * 1000 > duration_budget
+        ):
+            app.logger.warning(
+                "Request over budget: %s %s took %.1f ms with %d queries (%.1f ms in db)",
+                request.method,
+                request.path,
+                total * 1000,
+                timing.db_count,
+                timing.db_time * 1000,
+            )
+        return response
@@ -0,0 +1,128 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Startup
+
+Utilities that keep worker boot cheap: a schema check that replaces
+db.create_all(), a flask-restx Api that can serve its Swagger spec from a
+file, and timings of the boot phases and module imports.
+"""
+import os
+import sys
+import json
+import time
+import subprocess
+from contextlib import contextmanager
+from functools import cached_property
+from flask_restx import Api
+
+
+class BootProfile:
+    """Times the phases of create_app()"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        """Times the enclosed block as one phase"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = (time.perf_counter() - start) * 1000
+
+    def as_dict(self) -> dict:
+        """Returns the phase timings in milliseconds"""
+        total = (time.perf_counter() - self.start) * 1000
+        return dict(self.phases, total=total)
+
+    def report(self) -> str:
+        """Formats the phase timings on one line"""
+        return self.format(self.as_dict())
+
+    @staticmethod
+    def format(phases: dict) -> str:
+        """Formats phase timings on one line"""
+        return " ".join(f"{name}={ms:.1f}ms" for name, ms in phases.items())
+
+
+class CachedSpecApi(Api):
+    """Api that loads its Swagger spec from SWAGGER_CACHE_FILE when present
+
+    flask-restx already builds the spec lazily on the first request to
+    /api/swagger.json; the file skips that work in every new worker.
+    """
+
+    @cached_property
+    def __schema__(self):
+        path = self.app.config.get("SWAGGER_CACHE_FILE") if self.app else None
+        if path and os.path.isfile(path):
+            with open(path, encoding="utf-8") as file:
+                self._schema = json.load(file)
+        return super().__schema__
+
+
+def export_spec(api: Api, path: str) -> None:
+    """Writes the Swagger spec of the api to a file"""
+    # The spec holds absolute URLs so it needs a request context
+    with api.app.test_request_context(), open(path, "w", encoding="utf-8") as file:
+        json.dump(api.__schema__, file, sort_keys=True)
+
+
+def check_schema(app, db) -> None:
+    """Makes sure the tables exist the way DATABASE_SCHEMA_MODE asks for"""
+    # pylint: disable=import-outside-toplevel
+    from service.models import SchemaVersion, SCHEMA_VERSION
+
+    mode = app.config["DATABASE_SCHEMA_MODE"]
+    if mode == "create":
+        db.create_all()
+        version = SchemaVersion.current()
+        if version is None or version < SCHEMA_VERSION:
+            # Tables from before the version table get every migration
+            SchemaVersion.upgrade(version or 1)
+    elif mode == "verify":
+        version = SchemaVersion.current()
+        if version != SCHEMA_VERSION:
+            raise RuntimeError(
+                f"Database schema version {version} does not match {SCHEMA_VERSION}, "
+                "run 'flask db-upgrade'"
+            )
+    elif mode != "skip":
+        raise RuntimeError(f"Unknown DATABASE_SCHEMA_MODE '{mode}'")
+
+
+def import_profile(statement: str = "from wsgi import app", top: int = 20) -> list:
+    """Imports in a fresh interpreter and returns the slowest modules
+
+    Returns a list of (cumulative ms, self ms, module) sorted by cumulative time.
+    """
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    rows = []
+    for line in output.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        rows.append((int(cumulative_us) / 1000, int(self_us) / 1000, module.strip()))
+    return sorted(rows, reverse=True)[:top]
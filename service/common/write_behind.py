@@ -0,0 +1,191 @@
+######################################################################
+# Copyright 2016, 2024 John J. Rofrano. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+######################################################################
+
+"""
+Write-Behind Buffer
+
+Coalesces bursts of updates to the same ShopCart Item into one database
+write. Each update is acknowledged from memory and the pending state is
+written on a timer, when the buffer fills up, or at shutdown.
+
+Guarantees are set in service.config:
+    WRITE_BEHIND_WINDOW_MS     - an acknowledged update may be lost if the
+                                 worker dies within this window
+    WRITE_BEHIND_MAX_PENDING   - number of pending Items that forces a flush
+    WRITE_BEHIND_FLUSH_ON_READ - flush before any other request in the worker
+                                 so it observes the buffered writes
+
+A flush that fails is counted in shopcarts_write_behind_flush_errors_total
+and its Items go back into the buffer, behind any newer update of the same
+Item, to be written by the next flush. Items still pending when the worker
+exits are logged.
+
+Updates to one Item are last-write-wins in arrival order within a worker:
+flushes run one at a time, so a newer generation of pending Items is never
+committed before an older one. There is no ordering between gunicorn
+workers.
+"""
+import atexit
+import logging
+import threading
+from flask import request, has_app_context
+from service.common.metrics import WRITE_BEHIND_FLUSH_ERRORS
+from service.models import db, ShopCart, ShopCartItem, DataValidationError
+
+logger = logging.getLogger("flask.app")
+
+# The only request that is answered from the buffer instead of flushing it
+COALESCED_ENDPOINT = ("PUT", "item_resource")
+
+
+class WriteBehindBuffer:
+    """Holds pending ShopCart Item updates keyed by (shopcart_id, item_id)"""
+
+    def __init__(self, app, window_ms: int, max_pending: int):
+        self.app = app
+        self.window = window_ms / 1000.0
+        self.max_pending = max_pending
+        self._pending = {}
+        self._lock = threading.Lock()
+        # Held from taking the pending Items until they are committed
+        self._flush_lock = threading.Lock()
+        self._timer = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    def get(self, shopcart_id: int, item_id: int):
+        """Returns a copy of the pending Item state or None"""
+        with self._lock:
+            data = self._pending.get((shopcart_id, item_id))
+        return dict(data) if data is not None else None
+
+    def put(self, shopcart_id: int, item_id: int, data: dict) -> dict:
+        """Replaces the pending state of an Item and schedules a flush"""
+        with self._lock:
+            self._pending[(shopcart_id, item_id)] = dict(data)
+            count = len(self._pending)
+            self._schedule()
+        if count >= self.max_pending:
+            self.flush()
+        return data
+
+    def _schedule(self) -> None:
+        """Starts the flush timer unless it runs, the lock must be held"""
+        if self._timer is None:
+            self._timer = threading.Timer(self.window, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _requeue(self, pending: dict) -> None:
+        """Puts back the Items of a failed flush, newer updates win"""
+        WRITE_BEHIND_FLUSH_ERRORS.inc()
+        with self._lock:
+            for key, data in pending.items():
+                self._pending.setdefault(key, data)
+            self._schedule()
+
+    def flush(self) -> int:
+        """Writes all pending Items and returns how many were written
+
+        Waits for a flush already writing, so the caller also observes its
+        writes and the generations are committed in order. When the write
+        fails the Items are kept for the next flush and 0 is returned.
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+            if not pending:
+                return 0
+            if has_app_context():
+                written = self._write(pending)
+            else:
+                with self.app.app_context():
+                    written = self._write(pending)
+            if not written:
+                self._requeue(pending)
+                return 0
+        return len(pending)
+
+    def flush_at_exit(self) -> None:
+        """Writes the pending Items at shutdown and logs the ones left unwritten"""
+        self.flush()
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            lost = sorted(item_id for _, item_id in self._pending)
+        if lost:
+            logger.error("Lost the buffered updates of Items %s", ", ".join(map(str, lost)))
+
+    @staticmethod
+    def _write(pending: dict) -> bool:
+        """Applies the pending Items and their cart totals in one commit
+
+        Updates that can never be applied, to a deleted Item or with
+        invalid data, are dropped. Returns False when the commit failed.
+        """
+        logger.info("Flushing %d buffered Item updates", len(pending))
+        try:
+            shopcart_ids = set()
+            for (shopcart_id, item_id), data in pending.items():
+                item = ShopCartItem.find(item_id)
+                if not item:
+                    logger.warning("Dropping update for deleted Item %s", item_id)
+                    continue
+                try:
+                    item.deserialize(data)
+                except DataValidationError as error:
+                    db.session.refresh(item)
+                    logger.warning("Dropping invalid update for Item %s: %s", item_id, error)
+                    continue
+                shopcart_ids.update((shopcart_id, item.shop_cart_id))
+            # Writes the Items and all of their cart totals in one commit
+            ShopCart.update_totals(shopcart_ids)
+        except Exception as error:  # pylint: disable=broad-except
+            db.session.rollback()
+            logger.error("Error flushing buffered Item updates, retrying: %s", error)
+            return False
+        return True
+
+
+def get_buffer(app) -> WriteBehindBuffer:
+    """Returns the write-behind buffer of the app"""
+    return app.extensions["write_behind"]
+
+
+def init_write_behind(app):
+    """Set up the write-behind buffer and its flush hooks"""
+    buffer = WriteBehindBuffer(
+        app,
+        app.config["WRITE_BEHIND_WINDOW_MS"],
+        app.config["WRITE_BEHIND_MAX_PENDING"],
+    )
+    app.extensions["write_behind"] = buffer
+
+    @app.before_request
+    def flush_write_behind():  # pylint: disable=unused-variable
+        """Flushes buffered writes before requests that may read them"""
+        if not app.config["WRITE_BEHIND_FLUSH_ON_READ"]:
+            return
+        if (request.method, request.endpoint) != COALESCED_ENDPOINT:
+            buffer.flush()
+
+    atexit.register(buffer.flush_at_exit)
+    return buffer
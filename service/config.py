@@ -18,3 +18,100 @@ SQLALCHEMY_TRACK_MODIFICATIONS = False
 # Secret for session management
 SECRET_KEY = os.getenv("SECRET_KEY", "sup3r-s3cr3t")
 LOGGING_LEVEL = logging.INFO
+
+# Write-behind buffering of Item updates (see service/common/write_behind.py)
+WRITE_BEHIND_ENABLED = os.getenv("WRITE_BEHIND_ENABLED", "false").lower() == "true"
+# Longest time an acknowledged update is held only in memory before it is written
+WRITE_BEHIND_WINDOW_MS = int(os.getenv("WRITE_BEHIND_WINDOW_MS", "50"))
+# Flush early once this many Items are waiting to be written
+WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", "100"))
+# Flush before serving any other request so reads observe buffered writes
+WRITE_BEHIND_FLUSH_ON_READ = (
+    os.getenv("WRITE_BEHIND_FLUSH_ON_READ", "true").lower() == "true"
+)
+
+# Per-request SQL counting (see service/common/request_timing.py)
+# Adds Server-Timing and X-Query-Count headers to every response
+REQUEST_TIMING_HEADERS = os.getenv("REQUEST_TIMING_HEADERS", "false").lower() == "true"
+# Requests over these budgets are logged as warnings (0 disables a budget)
+QUERY_COUNT_BUDGET = int(os.getenv("QUERY_COUNT_BUDGET", "20"))
+REQUEST_DURATION_BUDGET_MS = int(os.getenv("REQUEST_DURATION_BUDGET_MS", "500"))
+
+# Logging pipeline (see service/common/log_handlers.py)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # json or text
+# Hand records to a background thread through a bounded queue
+LOG_ASYNC = os.getenv("LOG_ASYNC", "true").lower() == "true"
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Fraction of INFO and DEBUG records kept per logger: the models log to
+# flask.app and the routes to service, both once or more per request
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "flask.app=0.1,service=0.1")
+
+# How a worker makes sure the tables exist when it boots:
+#   create - run db.create_all() (development default), every worker migrates
+#            at boot so use it only with a single replica
+#   verify - only check the version stamped by "flask db-create" or "flask db-upgrade"
+#   skip   - trust the database
+DATABASE_SCHEMA_MODE = os.getenv("DATABASE_SCHEMA_MODE", "create")
+# Serve /api/swagger.json from this file when it exists ("flask swagger-export")
+SWAGGER_CACHE_FILE = os.getenv("SWAGGER_CACHE_FILE", "")
+
+# Memory watchdog (see service/common/memory.py)
+# Recycle the worker once its RSS is over this many MiB after a request (0 disables)
+MEMORY_SOFT_LIMIT_MB = int(os.getenv("MEMORY_SOFT_LIMIT_MB", "0"))
+# Shortest time between two garbage collections tried before recycling
+MEMORY_GC_INTERVAL_SECONDS = float(os.getenv("MEMORY_GC_INTERVAL_SECONDS", "60"))
+
+# Seconds a worker reuses its last /health/ready database check
+READINESS_CACHE_SECONDS = float(os.getenv("READINESS_CACHE_SECONDS", "5"))
+
+# Token buckets per shopcart or user on the write routes (see service/common/rate_limit.py)
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "false").lower() == "true"
+# "group=burst:refill per second" for the item_write and cart_write groups
+RATE_LIMITS = os.getenv("RATE_LIMITS", "item_write=20:5,cart_write=10:1")
+# memory, shared (across preloaded gunicorn workers) or a redis:// URL
+RATE_LIMIT_STORE = os.getenv("RATE_LIMIT_STORE", "memory")
+RATE_LIMIT_SHARED_SLOTS = int(os.getenv("RATE_LIMIT_SHARED_SLOTS", "4096"))
+
+# Admission control (see service/common/admission.py)
+# Cap on the /api requests a worker serves at once (0 disables), keep it
+# under GUNICORN_THREADS so that the extra threads queue here
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "0"))
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "16"))
+# Longest a request may wait for a slot before it is shed with 503
+ADMISSION_QUEUE_BUDGET_MS = int(os.getenv("ADMISSION_QUEUE_BUDGET_MS", "500"))
+# GET endpoints that wait behind everything else and get half the budget
+ADMISSION_HEAVY_ENDPOINTS = os.getenv(
+    "ADMISSION_HEAVY_ENDPOINTS",
+    "shopcart_collection,find_status_resource,user_resource,item_collection",
+)
+
+# Identical concurrent GETs share one response (see service/common/coalesce.py)
+COALESCE_ENABLED = os.getenv("COALESCE_ENABLED", "true").lower() == "true"
+# Longest a request waits for an identical one before being served on its own
+COALESCE_TIMEOUT_MS = int(os.getenv("COALESCE_TIMEOUT_MS", "2000"))
+
+# The change feed leaves out the changes of the last milliseconds, by the
+# database clock that stamps them, so that transactions still committing
+# cannot land behind a continuation token
+CHANGE_FEED_LAG_MS = int(os.getenv("CHANGE_FEED_LAG_MS", "1000"))
+
+# Server-Sent Events of cart changes over LISTEN/NOTIFY (see service/common/events.py)
+EVENTS_ENABLED = os.getenv("EVENTS_ENABLED", "true").lower() == "true"
+EVENTS_CHANNEL = os.getenv("EVENTS_CHANNEL", "shopcart_changes")
+# Every stream holds a gunicorn thread, keep it under GUNICORN_THREADS
+EVENTS_MAX_STREAMS = int(os.getenv("EVENTS_MAX_STREAMS", "2"))
+# Streams end after this long and browsers reconnect, freeing the thread
+EVENTS_STREAM_SECONDS = float(os.getenv("EVENTS_STREAM_SECONDS", "300"))
+EVENTS_HEARTBEAT_SECONDS = float(os.getenv("EVENTS_HEARTBEAT_SECONDS", "15"))
+
+# Transactional outbox for the downstream services (see service/common/outbox.py)
+# Only enable it with an outbox-dispatch process draining the table
+OUTBOX_ENABLED = os.getenv("OUTBOX_ENABLED", "false").lower() == "true"
+# file:<path>, stdout, or an http(s):// URL the batches are POSTed to
+OUTBOX_SINK = os.getenv("OUTBOX_SINK", "stdout")
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "500"))
+# Seconds the dispatcher sleeps when the outbox is empty
+OUTBOX_IDLE_SECONDS = float(os.getenv("OUTBOX_IDLE_SECONDS", "1"))
+
+# Encoder of the JSON responses, orjson or stdlib (see service/common/representations.py)
+JSON_ENCODER = os.getenv("JSON_ENCODER", "orjson")
@@ -9,3 +9,6 @@ from .shop_cart import ShopCart
 
 # , ShopCartStatus
 from .shop_cart_item import ShopCartItem
+from .shop_cart_tombstone import ShopCartTombstone
+from .outbox_event import OutboxEvent
+from .schema_version import SchemaVersion, SCHEMA_VERSION
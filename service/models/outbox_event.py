@@ -0,0 +1,121 @@
+"""
+Outbox Event Model
+
+Events for the downstream services are written to the outbox table in the
+same transaction as the change they describe, so an event is stored if
+and only if its change commits. The outbox-dispatch command delivers them
+later (see service/common/outbox.py).
+"""
+
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.dialects.postgresql import JSONB
+from .persistent_base import db, logger
+
+
+class OutboxEvent(db.Model):
+    """
+    Class that represents an event waiting to be dispatched
+    """
+
+    ##################################################
+    # Table Schema
+    ##################################################
+    id = db.Column(db.BigInteger, primary_key=True)
+    event_type = db.Column(db.String(63), nullable=False)
+    shop_cart_id = db.Column(db.Integer, nullable=False)
+    payload = db.Column(db.JSON().with_variant(JSONB(), "postgresql"), nullable=False)
+    created_at = db.Column(
+        db.DateTime(timezone=True), nullable=False, server_default=db.func.now()
+    )
+
+    def __repr__(self):
+        return f"<OutboxEvent {self.event_type} id=[{self.id}]>"
+
+    def serialize(self) -> dict:
+        """Serializes an OutboxEvent into the message sent downstream"""
+        return {
+            "id": self.id,
+            "type": self.event_type,
+            "shop_cart_id": self.shop_cart_id,
+            "created_at": self.created_at.isoformat(),
+            "payload": self.payload,
+        }
+
+    ##################################################
+    # CLASS METHODS
+    ##################################################
+
+    @classmethod
+    def claim(cls, limit: int) -> list:
+        """Locks the oldest OutboxEvents no other dispatcher holds
+
+        The rows stay locked until the transaction ends, so every
+        dispatcher gets its own batch.
+        """
+        logger.debug("Claiming up to %s outbox events", limit)
+        statement = (
+            db.select(cls)
+            .order_by(cls.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        return list(db.session.scalars(statement))
+
+    @classmethod
+    def remove(cls, ids) -> None:
+        """Deletes dispatched OutboxEvents, the commit is left to the caller"""
+        db.session.execute(
+            db.delete(cls).where(cls.id.in_(ids)),
+            execution_options={"synchronize_session": False},
+        )
+
+
+######################################################################
+# Writes the events of a flush in its transaction
+######################################################################
+def flush_events(session) -> list:
+    """Returns the outbox rows describing the ShopCarts and Items of a flush"""
+    # pylint: disable=import-outside-toplevel, cyclic-import
+    from .shop_cart import ShopCart
+    from .shop_cart_item import ShopCartItem
+
+    rows = []
+    for changes, action in ((session.new, "created"), (session.dirty, "updated"), (session.deleted, "deleted")):
+        for record in changes:
+            if isinstance(record, ShopCartItem) and (action != "updated" or session.is_modified(record)):
+                rows.append(
+                    {"event_type": f"item.{action}", "shop_cart_id": record.shop_cart_id, "payload": record.serialize()}
+                )
+            elif isinstance(record, ShopCart):
+                rows.extend(cart_events(record, action))
+    return rows
+
+
+def cart_events(shop_cart, action: str) -> list:
+    """Returns the outbox rows for a created, deleted or re-statused ShopCart"""
+    # Only what is loaded, a server default would take a query in the middle of the flush
+    values = db.inspect(shop_cart).dict
+    status = values.get("status")
+    payload = {
+        "id": shop_cart.id,
+        "user_id": values.get("user_id"),
+        "status": status.name if status else None,
+    }
+    if action == "updated":
+        history = db.inspect(shop_cart).attrs.status.history
+        if not history.deleted or history.added == history.deleted:
+            return []
+        payload["old_status"] = history.deleted[0].name
+        return [{"event_type": "shopcart.status_changed", "shop_cart_id": shop_cart.id, "payload": payload}]
+    return [{"event_type": f"shopcart.{action}", "shop_cart_id": shop_cart.id, "payload": payload}]
+
+
+@event.listens_for(db.session, "after_flush")
+def write_outbox(session, flush_context):  # pylint: disable=unused-argument
+    """Inserts the events of a flush before its transaction commits"""
+    if not has_app_context() or not current_app.config.get("OUTBOX_ENABLED"):
+        return
+    rows = flush_events(session)
+    if rows:
+        session.connection().execute(OutboxEvent.__table__.insert(), rows)
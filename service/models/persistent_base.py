@@ -18,9 +18,14 @@
 Persistent Base class for database CRUD functions
 """
 
+import json
 import logging
 from abc import abstractmethod
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from flask import current_app, has_app_context
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.dialects.postgresql import ARRAY
 
 logger = logging.getLogger("flask.app")
 
@@ -31,6 +36,58 @@ class DataValidationError(Exception):
     """Used for an data validation errors when deserializing"""
 
 
+def to_cents(amount) -> int:
+    """Returns an amount of money as whole cents, rounded half up
+
+    Prices are stored and added up as integer cents, they are amounts with
+    two decimals only in JSON.
+    """
+    try:
+        return int(Decimal(str(amount)).scaleb(2).quantize(Decimal(1), ROUND_HALF_UP))
+    except (InvalidOperation, ValueError) as error:
+        raise DataValidationError(f"Invalid amount of money: {amount}") from error
+
+
+def to_amount(cents: int) -> float:
+    """Returns whole cents as the amount JSON carries, the closest float to the exact amount"""
+    return cents / 100
+
+
+def notify_change(change: dict) -> None:
+    """Queues a NOTIFY on EVENTS_CHANNEL that Postgres sends on commit
+
+    The events of a transaction are sent together just before it commits,
+    in one round trip. Nothing is sent when the transaction rolls back, and
+    identical events of one transaction are sent once.
+    """
+    if not has_app_context() or not current_app.config.get("EVENTS_ENABLED"):
+        return
+    if db.engine.dialect.name != "postgresql":
+        return
+    db.session.info.setdefault("change_events", {})[json.dumps(change)] = None
+
+
+@event.listens_for(db.session, "before_commit")
+def send_change_events(session) -> None:
+    """Sends the queued events of a transaction with one statement"""
+    payloads = session.info.pop("change_events", None)
+    if not payloads:
+        return
+    channel = current_app.config["EVENTS_CHANNEL"]
+    session.execute(
+        db.select(db.func.pg_notify(channel, db.column("payload"))).select_from(
+            db.func.unnest(db.literal(list(payloads), ARRAY(db.Text))).alias("payload")
+        )
+    )
+
+
+@event.listens_for(db.session, "after_transaction_end")
+def drop_change_events(session, transaction) -> None:
+    """Forgets the events of a transaction that ended without committing"""
+    if transaction.parent is None:
+        session.info.pop("change_events", None)
+
+
 ######################################################################
 #  P E R S I S T E N T   B A S E   M O D E L
 ######################################################################
@@ -48,6 +105,10 @@ class PersistentBase:
     def deserialize(self, data: dict) -> None:
         """Convert a dictionary into an object"""
 
+    def change_event(self, action: str) -> dict:
+        """Returns what the listeners are told about a change"""
+        return {"table": self.__tablename__, "id": self.id, "action": action}
+
     def create(self) -> None:
         """
         Creates a Account to the database
@@ -57,6 +118,8 @@ class PersistentBase:
         self.id = None
         try:
             db.session.add(self)
+            db.session.flush()
+            notify_change(self.change_event("create"))
             db.session.commit()
         except Exception as e:
             db.session.rollback()
@@ -71,6 +134,7 @@ class PersistentBase:
         if not self.id:
             raise DataValidationError("Update called with empty ID field")
         try:
+            notify_change(self.change_event("update"))
             db.session.commit()
         except Exception as e:
             db.session.rollback()
@@ -81,6 +145,7 @@ class PersistentBase:
         """Removes a Account from the data store"""
         logger.info("Deleting %s", self)
         try:
+            notify_change(self.change_event("delete"))
             db.session.delete(self)
             db.session.commit()
         except Exception as e:
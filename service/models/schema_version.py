@@ -0,0 +1,89 @@
+"""
+Schema Version Model
+
+Records which version of the table definitions the database holds so that
+workers can check it with one query instead of running db.create_all()
+"""
+
+from .persistent_base import db, logger
+
+# Bump whenever a table definition changes and add its migration below
+SCHEMA_VERSION = 5
+
+CENTS_MIGRATION = (
+    "DO $$ BEGIN "
+    "IF (SELECT data_type FROM information_schema.columns "
+    "WHERE table_name = '{table}' AND column_name = '{column}') = 'numeric' THEN "
+    "ALTER TABLE {table} ALTER COLUMN {column} TYPE BIGINT USING round({column} * 100); "
+    "END IF; END $$"
+)
+
+# Statements that bring a database from the previous version to each version.
+# They must be safe to run on tables that db.create_all() just created.
+MIGRATIONS = {
+    2: [
+        "CREATE INDEX IF NOT EXISTS ix_shop_cart_item_shop_cart_id_product_id "
+        "ON shop_cart_item (shop_cart_id, product_id)",
+        "CREATE INDEX IF NOT EXISTS ix_shop_cart_item_product_id_shop_cart_id "
+        "ON shop_cart_item (product_id, shop_cart_id)",
+    ],
+    3: [
+        "ALTER TABLE shop_cart ADD COLUMN IF NOT EXISTS updated_at "
+        "TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now()",
+        "CREATE INDEX IF NOT EXISTS ix_shop_cart_updated_at_id ON shop_cart (updated_at, id)",
+        "CREATE TABLE IF NOT EXISTS shop_cart_tombstone "
+        "(id INTEGER PRIMARY KEY, deleted_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now())",
+        "CREATE INDEX IF NOT EXISTS ix_shop_cart_tombstone_deleted_at_id "
+        "ON shop_cart_tombstone (deleted_at, id)",
+    ],
+    4: [
+        "CREATE TABLE IF NOT EXISTS outbox_event "
+        "(id BIGSERIAL PRIMARY KEY, event_type VARCHAR(63) NOT NULL, shop_cart_id INTEGER NOT NULL, "
+        "payload JSONB NOT NULL, created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT now())",
+    ],
+    # Prices become whole cents, unless db.create_all() already made them BIGINT
+    5: [
+        CENTS_MIGRATION.format(table=table, column=column)
+        for table, column in (("shop_cart", "total_price"), ("shop_cart_item", "price"))
+    ],
+}
+
+
+class SchemaVersion(db.Model):
+    """
+    Class that represents the version of the database schema
+    """
+
+    ##################################################
+    # Table Schema
+    ##################################################
+    version = db.Column(db.Integer, primary_key=True)
+
+    def __repr__(self):
+        return f"<SchemaVersion {self.version}>"
+
+    ##################################################
+    # CLASS METHODS
+    ##################################################
+
+    @classmethod
+    def current(cls):
+        """Returns the newest schema version stamped in the database"""
+        return db.session.query(db.func.max(cls.version)).scalar()
+
+    @classmethod
+    def upgrade(cls, version=1):
+        """Runs the migrations after the given version and stamps the newest"""
+        for step in range(version + 1, SCHEMA_VERSION + 1):
+            logger.info("Migrating the database to schema version %s", step)
+            for statement in MIGRATIONS.get(step, []):
+                db.session.execute(db.text(statement))
+        cls.stamp()
+
+    @classmethod
+    def stamp(cls, version=SCHEMA_VERSION):
+        """Records that the database holds the given schema version"""
+        logger.info("Stamping schema version %s", version)
+        if not db.session.get(cls, version):
+            db.session.add(cls(version=version))
+        db.session.commit()
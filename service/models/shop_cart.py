@@ -4,8 +4,11 @@ Shop Cart Model
 """
 
 from enum import Enum
-from .persistent_base import db, logger, DataValidationError, PersistentBase
+from sqlalchemy.orm import load_only, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+from .persistent_base import db, logger, notify_change, to_amount, to_cents, DataValidationError, PersistentBase
 from .shop_cart_item import ShopCartItem
+from .shop_cart_tombstone import ShopCartTombstone
 
 
 class ShopCartStatus(Enum):
@@ -27,35 +30,57 @@ class ShopCart(db.Model, PersistentBase):
     ##################################################
     # Table Schema
     ##################################################
+    __table_args__ = (
+        # Change feed pages
+        db.Index("ix_shop_cart_updated_at_id", "updated_at", "id"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer)
     name = db.Column(db.String(63))
-    total_price = db.Column(db.Numeric(precision=10, scale=2))
+    # In cents
+    total_price = db.Column(db.BigInteger)
     status = db.Column(
         db.Enum(ShopCartStatus),
         nullable=False,
         server_default=(ShopCartStatus.ACTIVE.name),
     )
+    # Bumped by every UPDATE of the row, including the totals an Item change triggers
+    updated_at = db.Column(
+        db.DateTime(timezone=True),
+        nullable=False,
+        server_default=db.func.now(),
+        onupdate=db.func.now(),
+    )
 
     items = db.relationship("ShopCartItem", backref="shop_cart", passive_deletes=True)
 
+    # Columns that serialize() can return
+    FIELDS = ("id", "user_id", "name", "total_price", "status")
+
     def __repr__(self):
         return f"<ShopCart {self.name} id=[{self.id}]>"
 
-    def serialize(self) -> dict:
-        """Serializes a ShopCart into a dictionary"""
-        shop_cart = {
-            "id": self.id,
-            "user_id": self.user_id,
-            "name": self.name,
-            "total_price": float(self.total_price),
-            "status": self.status.name,
-            "items": [],
-        }
-        for item in self.items:
-            shop_cart["items"].append(item.serialize())
+    def serialize(self, fields=None, include_items=True) -> dict:
+        """Serializes a ShopCart into a dictionary
+
+        Args:
+            fields (list): the columns to include, all of them when None
+            include_items (bool): include the Items, which loads them when needed
+        """
+        shop_cart = {name: getattr(self, name) for name in fields or self.FIELDS if name != "items"}
+        if "total_price" in shop_cart:
+            shop_cart["total_price"] = to_amount(shop_cart["total_price"])
+        if "status" in shop_cart:
+            shop_cart["status"] = shop_cart["status"].name
+        if include_items:
+            shop_cart["items"] = [item.serialize() for item in self.items]
         return shop_cart
 
+    def change_event(self, action: str) -> dict:
+        """Returns what the listeners are told about a change"""
+        return dict(super().change_event(action), shop_cart_id=self.id)
+
     def deserialize(self, data):
         """
         Deserializes a ShopCart from a dictionary
@@ -66,7 +91,7 @@ class ShopCart(db.Model, PersistentBase):
         try:
             self.user_id = data["user_id"]
             self.name = data["name"]
-            self.total_price = data["total_price"]
+            self.total_price = to_cents(data["total_price"])
             # Check if the status in data is already a ShopCartStatus instance
             if isinstance(data["status"], ShopCartStatus):
                 self.status = data["status"]
@@ -97,57 +122,224 @@ class ShopCart(db.Model, PersistentBase):
     def update_total_price(self):
         """
         update the total price of a ShopCart
-        """
-        price = 0
-        for item in self.items:
-            if item.price is not None and item.quantity is not None:
-                price += item.price * item.quantity
 
-        self.total_price = price
+        The database sums the Items, so they are never loaded. Nothing is
+        updated when the ShopCart was deleted meanwhile.
+        """
+        statement = (
+            db.update(ShopCart)
+            .where(ShopCart.id == self.id)
+            .values(total_price=ShopCart.subtotal())
+            .returning(ShopCart.total_price)
+            .execution_options(synchronize_session=False)
+        )
+        total = db.session.execute(statement).scalar_one_or_none()
+        if total is None:
+            logger.info("ShopCart %s is gone, not updating its total price", self.id)
+            return
+        set_committed_value(self, "total_price", total)
         self.update()
 
+    def delete(self):
+        """Removes a ShopCart and leaves a tombstone for the change feed"""
+        db.session.merge(ShopCartTombstone(id=self.id))
+        super().delete()
+
     ##################################################
     # CLASS METHODS
     ##################################################
 
     @classmethod
-    def all(cls):
+    def load_options(cls, fields=None, include_items=True) -> list:
+        """Returns the loader options that fetch only what serialize() will use
+
+        Args:
+            fields (list): the columns to load, all of them when None
+            include_items (bool): load the Items of all ShopCarts in one more query
+        """
+        options = []
+        columns = [getattr(cls, name) for name in fields or () if name != "items"]
+        if columns:
+            options.append(load_only(*columns))
+        if include_items:
+            options.append(selectinload(cls.items))
+        return options
+
+    @classmethod
+    def subtotal(cls):
+        """Returns the sum of the Items of each ShopCart as a correlated subquery"""
+        return (
+            db.select(
+                db.func.coalesce(
+                    db.func.sum(ShopCartItem.price * ShopCartItem.quantity), 0
+                )
+            )
+            .where(ShopCartItem.shop_cart_id == cls.id)
+            .scalar_subquery()
+        )
+
+    @classmethod
+    def update_totals(cls, ids=None) -> int:
+        """Recomputes the total price of many ShopCarts in one UPDATE
+
+        Args:
+            ids (iterable): ids of the ShopCarts to update, all of them when None
+        Returns:
+            the number of ShopCarts updated
+        """
+        logger.info("Updating the total price of %s ShopCarts", "all" if ids is None else len(ids))
+        statement = db.update(cls).values(total_price=cls.subtotal())
+        if ids is not None:
+            statement = statement.where(cls.id.in_(ids))
+        try:
+            result = db.session.execute(
+                statement, execution_options={"synchronize_session": False}
+            )
+            for shop_cart_id in ids or ():
+                notify_change(
+                    {"table": cls.__tablename__, "id": shop_cart_id, "action": "update", "shop_cart_id": shop_cart_id}
+                )
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error("Error updating the total price of ShopCarts")
+            raise DataValidationError(e) from e
+        return result.rowcount
+
+    @classmethod
+    def all(cls, *options):
         """Returns all of the ShopCarts in the database"""
         logger.info("Processing all ShopCarts")
-        return cls.query.all()
+        return cls.query.options(*options).all()
 
     @classmethod
-    def find(cls, by_id):
+    def find(cls, by_id, *options):
         """Finds a ShopCart by it's ID"""
         logger.info("Processing lookup for id %s ...", by_id)
-        return cls.query.session.get(cls, by_id)
+        return cls.query.session.get(cls, by_id, options=options)
 
     @classmethod
-    def find_by_name(cls, name):
+    def find_item(cls, shop_cart_id, item_id=None, product_id=None):
+        """Finds an Item of a ShopCart and whether the ShopCart exists in one query
+
+        The Item is matched by item_id or by product_id, and only when it
+        belongs to the ShopCart.
+
+        Returns:
+            (True, item) when both exist, (True, None) when the Item does not,
+            (False, None) when the ShopCart does not
+        """
+        logger.info("Processing lookup for item %s of shopcart %s ...", item_id or product_id, shop_cart_id)
+        condition = ShopCartItem.shop_cart_id == cls.id
+        if item_id is not None:
+            condition &= ShopCartItem.id == item_id
+        if product_id is not None:
+            condition &= ShopCartItem.product_id == product_id
+        statement = (
+            db.select(cls.id, ShopCartItem)
+            .outerjoin(ShopCartItem, condition)
+            .where(cls.id == shop_cart_id)
+            .order_by(ShopCartItem.id)
+            .limit(1)
+        )
+        row = db.session.execute(statement).first()
+        if row is None:
+            return False, None
+        return True, row[1]
+
+    @classmethod
+    def find_by_name(cls, name, *options):
         """Returns all ShopCarts with the given name
 
         Args:
             name (string): the name of the ShopCart you want to match
         """
         logger.info("Processing name query for %s ...", name)
-        return cls.query.filter(cls.name == name)
+        return cls.query.options(*options).filter(cls.name == name)
 
     @classmethod
-    def find_by_user_id(cls, user_id):
+    def find_by_user_id(cls, user_id, *options):
         """Returns all ShopCarts associated with the given user_id
 
         Args:
             user_id (int): the user_id associated with the ShopCarts
         """
         logger.info("Processing user_id query for %s ...", user_id)
-        return cls.query.filter(cls.user_id == user_id).all()
+        return cls.query.options(*options).filter(cls.user_id == user_id).all()
+
+    @classmethod
+    def find_by_product_id(cls, product_id, after=0, limit=50):
+        """Returns a page of the ShopCarts holding a product
+
+        Pages are keyed on the ShopCart id so every page is read from the
+        (product_id, shop_cart_id) index.
+
+        Args:
+            product_id (int): the product_id of the Items to look for
+            after (int): return the ShopCarts with an id greater than this
+            limit (int): the most ShopCarts to return
+        Returns:
+            a list of (ShopCart, total quantity of the product) tuples
+        """
+        logger.info("Processing product_id query for %s after %s ...", product_id, after)
+        statement = (
+            db.select(cls, db.func.sum(ShopCartItem.quantity))
+            .join(ShopCartItem, ShopCartItem.shop_cart_id == cls.id)
+            .where(ShopCartItem.product_id == product_id, ShopCartItem.shop_cart_id > after)
+            .group_by(cls.id, ShopCartItem.shop_cart_id)
+            .order_by(ShopCartItem.shop_cart_id)
+            .limit(limit)
+        )
+        return [tuple(row) for row in db.session.execute(statement)]
+
+    @classmethod
+    def find_changes(cls, since, after_id, lag, limit, *options):
+        """Returns the ShopCarts changed and deleted after a point in the feed
+
+        Changes are ordered by (time, id). The ShopCarts and the tombstones
+        are each read from their (time, id) index and merged. The cutoff is
+        taken from the database clock, which also stamps the changes.
+
+        Args:
+            since (datetime): the time of the last change already seen
+            after_id (int): the id of the last change already seen
+            lag (timedelta): leave out the changes made this recently
+            limit (int): the most changes to return
+        Returns:
+            a list of (time, id, ShopCart or None when deleted) tuples
+        """
+        logger.info("Processing changes after %s id %s ...", since, after_id)
+        until = db.func.now() - lag
+        carts = db.session.scalars(
+            db.select(cls)
+            .options(*options)
+            .where(
+                db.tuple_(cls.updated_at, cls.id) > db.tuple_(since, after_id),
+                cls.updated_at < until,
+            )
+            .order_by(cls.updated_at, cls.id)
+            .limit(limit)
+        )
+        tombstones = db.session.scalars(
+            db.select(ShopCartTombstone)
+            .where(
+                db.tuple_(ShopCartTombstone.deleted_at, ShopCartTombstone.id)
+                > db.tuple_(since, after_id),
+                ShopCartTombstone.deleted_at < until,
+            )
+            .order_by(ShopCartTombstone.deleted_at, ShopCartTombstone.id)
+            .limit(limit)
+        )
+        changes = [(cart.updated_at, cart.id, cart) for cart in carts]
+        changes += [(tombstone.deleted_at, tombstone.id, None) for tombstone in tombstones]
+        return sorted(changes, key=lambda change: change[:2])[:limit]
 
     @classmethod
-    def find_by_status(cls, status):
+    def find_by_status(cls, status, *options):
         """Returns all ShopCarts with the given status
 
         Args:
             status (ShopCartStatus): the status of the ShopCarts you want to match
         """
         logger.info("Processing status query for %s ...", status)
-        return cls.query.filter(cls.status == status).all()
+        return cls.query.options(*options).filter(cls.status == status).all()
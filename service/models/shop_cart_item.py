@@ -3,7 +3,7 @@ Shop Cart Item Model
 
 """
 
-from .persistent_base import db, logger, DataValidationError, PersistentBase
+from .persistent_base import db, logger, to_amount, to_cents, DataValidationError, PersistentBase
 
 
 class ShopCartItem(db.Model, PersistentBase):
@@ -14,6 +14,13 @@ class ShopCartItem(db.Model, PersistentBase):
     ##################################################
     # Table Schema
     ##################################################
+    __table_args__ = (
+        # Items of a cart, and a product within a cart
+        db.Index("ix_shop_cart_item_shop_cart_id_product_id", "shop_cart_id", "product_id"),
+        # Carts holding a product, in cart order for paging
+        db.Index("ix_shop_cart_item_product_id_shop_cart_id", "product_id", "shop_cart_id"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     shop_cart_id = db.Column(
         db.Integer, db.ForeignKey("shop_cart.id", ondelete="CASCADE"), nullable=False
@@ -22,7 +29,8 @@ class ShopCartItem(db.Model, PersistentBase):
     name = db.Column(db.String(63))
     product_id = db.Column(db.Integer)
     quantity = db.Column(db.Integer)
-    price = db.Column(db.Numeric(precision=10, scale=2))
+    # In cents
+    price = db.Column(db.BigInteger)
 
     def __repr__(self):
         return f"<ShopCartItem {self.name} id=[{self.id}] shop_cart_id=[{self.shop_cart_id}]>"
@@ -38,9 +46,13 @@ class ShopCartItem(db.Model, PersistentBase):
             "name": self.name,
             "product_id": self.product_id,
             "quantity": self.quantity,
-            "price": float(self.price),
+            "price": to_amount(self.price),
         }
 
+    def change_event(self, action: str) -> dict:
+        """Returns what the listeners are told about a change, for its ShopCart"""
+        return dict(super().change_event(action), shop_cart_id=self.shop_cart_id)
+
     def deserialize(self, data):
         """
         Deserializes a ShopCart Item from a dictionary
@@ -53,7 +65,7 @@ class ShopCartItem(db.Model, PersistentBase):
             self.name = data["name"]
             self.product_id = data["product_id"]
             self.quantity = data["quantity"]
-            self.price = data["price"]
+            self.price = to_cents(data["price"])
         # pylint: disable=duplicate-code
         except AttributeError as error:
             raise DataValidationError("Invalid attribute: " + error.args[0]) from error
@@ -96,13 +108,13 @@ class ShopCartItem(db.Model, PersistentBase):
 
     @classmethod
     def find_by_product_id(cls, product_id):
-        """Returns all ShopCart Items with the given product_id
+        """Returns the first ShopCart Item with the given product_id
 
         Args:
-            product_id (string): the product_id of the ShopCart Item you want to match
+            product_id (int): the product_id of the ShopCart Item you want to match
         """
         logger.info("Processing lookup for product_id: %s", product_id)
-        return cls.query.filter(cls.product_id == product_id).first()
+        return cls.query.filter(cls.product_id == product_id).order_by(cls.id).first()
 
     # @classmethod
     # def find_by_shopcart_id(cls, shopcart_id):
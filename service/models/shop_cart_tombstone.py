@@ -0,0 +1,31 @@
+"""
+Shop Cart Tombstone Model
+
+Remembers the ShopCarts that were deleted so that the change feed can
+tell its readers about them
+"""
+
+from .persistent_base import db
+
+
+class ShopCartTombstone(db.Model):  # pylint: disable=too-few-public-methods
+    """
+    Class that represents a deleted ShopCart
+    """
+
+    ##################################################
+    # Table Schema
+    ##################################################
+    __table_args__ = (
+        # Change feed pages, in the same order as the ShopCarts
+        db.Index("ix_shop_cart_tombstone_deleted_at_id", "deleted_at", "id"),
+    )
+
+    # The id the ShopCart had
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    deleted_at = db.Column(
+        db.DateTime(timezone=True), nullable=False, server_default=db.func.now()
+    )
+
+    def __repr__(self):
+        return f"<ShopCartTombstone id=[{self.id}]>"
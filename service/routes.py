@@ -14,17 +14,24 @@
 # limitations under the License.
 ######################################################################
 # spell: ignore Rofrano jsonify restx dbname shopcart shopcarts reqparse
+# pylint: disable=too-many-lines
 """
 Shop Cart Service
 
 This service implements a REST API that allows you to Create, Read, Update
 and Delete Shop Carts
 """
-from decimal import Decimal
-from flask import request, abort, current_app as app
-from flask_restx import Resource, fields, reqparse
+import base64
+from datetime import datetime, timedelta, timezone
+from flask import Response, request, abort, current_app as app
+from flask_restx import Resource, fields, inputs, reqparse
 from service.models.shop_cart import ShopCart, ShopCartItem, ShopCartStatus
+from service.models.persistent_base import to_amount, to_cents
 from service.common import status  # HTTP Status Codes
+from service.common.events import event_stream, get_listener
+from service.common.health import get_readiness
+from service.common.metrics import record_cache, render
+from service.common.write_behind import get_buffer
 from . import api
 
 
@@ -46,6 +53,31 @@ def health():
     return {"status": "OK"}, status.HTTP_200_OK
 
 
+@app.route("/health/live")
+def health_live():
+    """Liveness: the worker answers requests, the database is not checked"""
+    return {"status": "OK"}, status.HTTP_200_OK
+
+
+@app.route("/health/ready")
+def health_ready():
+    """Readiness: the database answers and the pool has a connection to spare"""
+    ready, details = get_readiness(app).get()
+    if not ready:
+        return dict(details, status="UNAVAILABLE"), status.HTTP_503_SERVICE_UNAVAILABLE
+    return dict(details, status="OK"), status.HTTP_200_OK
+
+
+############################################################
+# METRICS
+############################################################
+@app.route("/metrics")
+def metrics():
+    """Prometheus metrics"""
+    body, content_type = render()
+    return body, status.HTTP_200_OK, {"Content-Type": content_type}
+
+
 # Define the model so that the docs reflect what can be sent
 create_item_model = api.model(
     "Item",
@@ -114,8 +146,32 @@ shopcart_model = api.inherit(
     },
 )
 
+# query string arguments that choose what a ShopCart response holds
+shopcart_view_args = reqparse.RequestParser()
+shopcart_view_args.add_argument(
+    "fields",
+    type=str,
+    location="args",
+    required=False,
+    help=f"Comma separated Shopcart fields to return: {', '.join(ShopCart.FIELDS + ('items',))}",
+)
+shopcart_view_args.add_argument(
+    "include_items",
+    type=inputs.boolean,
+    location="args",
+    required=False,
+    help="Set to false to leave the items out",
+)
+shopcart_view_args.add_argument(
+    "expand",
+    type=str,
+    location="args",
+    required=False,
+    help="Set to items to include the items",
+)
+
 # query string arguments
-shopcart_args = reqparse.RequestParser()
+shopcart_args = shopcart_view_args.copy()
 shopcart_args.add_argument(
     "name", type=str, location="args", required=False, help="List Shopcarts by name"
 )
@@ -131,6 +187,82 @@ shopcart_args.add_argument(
 )
 
 
+# Pages of the ShopCarts holding a product
+MAX_PAGE_SIZE = 500
+
+product_cart_model = api.model(
+    "ProductCart",
+    {
+        "id": fields.Integer(readOnly=True, description="The Id of the shopcart"),
+        "user_id": fields.Integer(description="User ID of the shopcart owner"),
+        "name": fields.String(description="Name of the shopcart"),
+        # pylint: disable=protected-access
+        "status": fields.String(
+            enum=ShopCartStatus._member_names_,
+            description="Status of the shopcart",
+        ),
+        "total_price": fields.Float(description="Total price of the shopcart"),
+        "quantity": fields.Integer(description="Quantity of the product in the shopcart"),
+    },
+)
+
+product_cart_args = reqparse.RequestParser()
+product_cart_args.add_argument(
+    "after",
+    type=int,
+    location="args",
+    required=False,
+    default=0,
+    help="Return the Shopcarts with an id greater than this",
+)
+product_cart_args.add_argument(
+    "limit",
+    type=int,
+    location="args",
+    required=False,
+    default=50,
+    help=f"Number of Shopcarts to return, at most {MAX_PAGE_SIZE}",
+)
+
+# Pages of the change feed
+change_model = api.model(
+    "ShopcartChange",
+    {
+        "id": fields.Integer(description="The Id of the shopcart"),
+        "deleted": fields.Boolean(description="True when the shopcart was deleted"),
+        "changed_at": fields.DateTime(description="When the shopcart was changed or deleted"),
+        "shopcart": fields.Nested(shopcart_model, allow_null=True, description="The shopcart, null when deleted"),
+    },
+)
+
+change_page_model = api.model(
+    "ShopcartChanges",
+    {
+        "changes": fields.List(fields.Nested(change_model)),
+        "next": fields.String(description="The since token of the next page"),
+        "more": fields.Boolean(description="True when more changes are ready"),
+    },
+)
+
+change_args = shopcart_view_args.copy()
+change_args.add_argument(
+    "since",
+    type=str,
+    location="args",
+    required=False,
+    default="",
+    help="The next token of the last page read, every shopcart when empty",
+)
+change_args.add_argument(
+    "limit",
+    type=int,
+    location="args",
+    required=False,
+    default=100,
+    help=f"Number of changes to return, at most {MAX_PAGE_SIZE}",
+)
+
+
 ######################################################################
 #  PATH: /shopcarts/{id}
 ######################################################################
@@ -151,7 +283,8 @@ class ShopcartResource(Resource):
     # ------------------------------------------------------------------
     @api.doc("get_shopcarts")
     @api.response(404, "Shopcart not found")
-    @api.marshal_with(shopcart_model)
+    @api.response(200, "Success", shopcart_model)
+    @api.expect(shopcart_view_args, validate=True)
     def get(self, shopcart_id):
         """
         Retrieve a single Shopcart
@@ -159,16 +292,17 @@ class ShopcartResource(Resource):
         This endpoint will return a Shopcart based on it's id
         """
         app.logger.info("Request for Shopcart with id: %s", shopcart_id)
+        view = shopcart_view()
 
         # See if the account exists and abort if it doesn't
-        shopcart = ShopCart.find(shopcart_id)
+        shopcart = ShopCart.find(shopcart_id, *ShopCart.load_options(*view))
         if not shopcart:
             abort(
                 status.HTTP_404_NOT_FOUND,
                 f"Shopcart with id '{shopcart_id}' could not be found.",
             )
 
-        return shopcart.serialize(), status.HTTP_200_OK
+        return shopcart.serialize(*view), status.HTTP_200_OK
 
     # ------------------------------------------------------------------
     # UPDATE AN EXISTING SHOPCART
@@ -240,28 +374,30 @@ class ShopcartCollection(Resource):
     # ------------------------------------------------------------------
     @api.doc("list_shopcarts")
     @api.expect(shopcart_args, validate=True)
-    @api.marshal_list_with(shopcart_model)
+    @api.response(200, "Success", [shopcart_model])
     def get(self):
         """List all shop carts"""
         app.logger.info("Request for Shop Cart list")
         shop_carts = []
         args = shopcart_args.parse_args()
+        view = shopcart_view()
+        options = ShopCart.load_options(*view)
 
         if args.get("user_id"):
             app.logger.info("Filtering by user_id: %s", args.get("user_id"))
-            shop_carts = ShopCart.find_by_user_id(args.get("user_id"))
+            shop_carts = ShopCart.find_by_user_id(args.get("user_id"), *options)
         elif args.get("name"):
             app.logger.info("Filtering by name: %s", args.get("name"))
-            shop_carts = ShopCart.find_by_name(args.get("name")).all()
+            shop_carts = ShopCart.find_by_name(args.get("name"), *options).all()
         elif args.get("status"):
             app.logger.info("Filtering by status: %s", args.get("status"))
-            shop_carts = ShopCart.find_by_status(args.get("status"))
+            shop_carts = ShopCart.find_by_status(args.get("status"), *options)
         else:
             app.logger.info("Returning unfiltered list.")
-            shop_carts = ShopCart.all()
+            shop_carts = ShopCart.all(*options)
 
         app.logger.info("[%s] shopcarts returned", len(shop_carts))
-        results = [shop_cart.serialize() for shop_cart in shop_carts]
+        results = [shop_cart.serialize(*view) for shop_cart in shop_carts]
         return results, status.HTTP_200_OK
 
     # ------------------------------------------------------------------
@@ -355,6 +491,7 @@ class FindStatusResource(Resource):
 
     @api.doc("find_shopcart_by_status")
     @api.response(404, "status not found")
+    @api.expect(shopcart_view_args, validate=True)
     def get(self, status_name):
         """
         Sort ShopCarts by Status
@@ -372,12 +509,116 @@ class FindStatusResource(Resource):
                 f"Invalid status value: '{status_name}'. Must be one of {[s.name for s in ShopCartStatus]}",
             )
 
-        shopcarts = ShopCart.find_by_status(status_enum)
-        results = [shopcart.serialize() for shopcart in shopcarts]
+        view = shopcart_view()
+        shopcarts = ShopCart.find_by_status(status_enum, *ShopCart.load_options(*view))
+        results = [shopcart.serialize(*view) for shopcart in shopcarts]
 
         return results, status.HTTP_200_OK
 
 
+######################################################################
+#  PATH: /shopcarts/{id}/events
+######################################################################
+@api.route("/shopcarts/<int:shopcart_id>/events")
+@api.param("shopcart_id", "The shopcart identifier")
+class ShopcartEventsResource(Resource):
+    """Pushes the changes of a Shopcart to the browser"""
+
+    # ------------------------------------------------------------------
+    # STREAM SHOPCART CHANGES
+    # ------------------------------------------------------------------
+    @api.doc("stream_shopcart_events")
+    @api.produces(["text/event-stream"])
+    @api.response(404, "Shopcart not found")
+    @api.response(503, "No stream left on this worker, poll instead")
+    def get(self, shopcart_id):
+        """
+        Stream the changes of a Shopcart as Server-Sent Events
+
+        Every change of the Shopcart or its Items sends an event named
+        create, update or delete; reload the Shopcart when one arrives.
+        A resync event means changes may have been missed.
+        """
+        app.logger.info("Request for the events of Shopcart %s", shopcart_id)
+        listener = get_listener(app)
+        if listener is None:
+            abort(status.HTTP_503_SERVICE_UNAVAILABLE, "Shopcart events are disabled.")
+        if not ShopCart.find(shopcart_id, *ShopCart.load_options(["id"], False)):
+            abort(
+                status.HTTP_404_NOT_FOUND,
+                f"Shopcart with id '{shopcart_id}' could not be found.",
+            )
+
+        events = listener.subscribe(shopcart_id)
+        if events is None:
+            return (
+                {
+                    "status_code": status.HTTP_503_SERVICE_UNAVAILABLE,
+                    "error": "Service Unavailable",
+                    "message": "No event stream left, poll the shopcart instead",
+                },
+                status.HTTP_503_SERVICE_UNAVAILABLE,
+                {"Retry-After": str(int(app.config["EVENTS_HEARTBEAT_SECONDS"]))},
+            )
+        # The stream runs after the request ended, without a database session
+        response = Response(
+            event_stream(events, app.config["EVENTS_HEARTBEAT_SECONDS"], app.config["EVENTS_STREAM_SECONDS"]),
+            mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+        response.call_on_close(lambda: listener.unsubscribe(shopcart_id, events))
+        return response
+
+
+######################################################################
+#  PATH: /shopcarts/changes
+######################################################################
+@api.route("/shopcarts/changes")
+class ChangesResource(Resource):
+    """Feed of the ShopCarts changed or deleted since a token"""
+
+    # ------------------------------------------------------------------
+    # LIST CHANGES
+    # ------------------------------------------------------------------
+    @api.doc("list_shopcart_changes")
+    @api.response(400, "The since token was not valid")
+    @api.response(200, "Success", change_page_model)
+    @api.expect(change_args, validate=True)
+    def get(self):
+        """
+        List the ShopCarts changed since a token
+
+        Each ShopCart appears once at its latest change; a deleted one
+        appears as a tombstone. Pass the next token of a page as since to
+        read the following one. It is returned even when the page is
+        empty, so readers can poll with it.
+        """
+        args = change_args.parse_args()
+        limit = min(max(args["limit"], 1), MAX_PAGE_SIZE)
+        since, after_id = decode_change_token(args["since"])
+        fields_, include_items = shopcart_view()
+        app.logger.info("Request for ShopCart changes after %s id %s", since, after_id)
+
+        # updated_at orders the feed, so it is loaded with any sparse fields
+        options = ShopCart.load_options(fields_ and fields_ + ["updated_at"], include_items)
+        lag = timedelta(milliseconds=app.config["CHANGE_FEED_LAG_MS"])
+        changes = ShopCart.find_changes(since, after_id, lag, limit + 1, *options)
+
+        results = [
+            {
+                "id": shopcart_id,
+                "deleted": shopcart is None,
+                "changed_at": changed_at.isoformat(),
+                "shopcart": shopcart and shopcart.serialize(fields_, include_items),
+            }
+            for changed_at, shopcart_id, shopcart in changes[:limit]
+        ]
+        token = args["since"]
+        if results:
+            token = encode_change_token(*changes[: len(results)][-1][:2])
+        return {"changes": results, "next": token, "more": len(changes) > limit}, status.HTTP_200_OK
+
+
 ######################################################################
 #  PATH: /shopcarts/user/{user_id}
 ######################################################################
@@ -388,6 +629,7 @@ class UserResource(Resource):
 
     @api.doc("find_shopcart_by_user_id")
     @api.response(404, "status not found")
+    @api.expect(shopcart_view_args, validate=True)
     def get(self, user_id):
         """
         Search ShopCarts by User ID
@@ -396,14 +638,15 @@ class UserResource(Resource):
         """
         app.logger.info("Request to search ShopCarts by User ID: %s", user_id)
 
-        shopcarts = ShopCart.find_by_user_id(user_id)
+        view = shopcart_view()
+        shopcarts = ShopCart.find_by_user_id(user_id, *ShopCart.load_options(*view))
         if not shopcarts:
             abort(
                 status.HTTP_404_NOT_FOUND,
                 f"No ShopCarts found for User ID '{user_id}'.",
             )
 
-        results = [shopcart.serialize() for shopcart in shopcarts]
+        results = [shopcart.serialize(*view) for shopcart in shopcarts]
         return results, status.HTTP_200_OK
 
 
@@ -436,16 +679,15 @@ class ItemResource(Resource):
             "Request to retrieve Item %s for ShopCart id: %s", (item_id, shopcart_id)
         )
 
-        # Search for the shopcart
-        shopcart = ShopCart.find(shopcart_id)
-        if not shopcart:
+        # Search for the shopcart and its item in one query
+        found, item = ShopCart.find_item(shopcart_id, item_id=item_id)
+        if not found:
             abort(
                 status.HTTP_404_NOT_FOUND,
                 f"ShopCart with ID '{shopcart_id}' could not be found",
             )
 
         # See if the item exists and abort if it doesn't
-        item = ShopCartItem.find(item_id)
         if not item:
             abort(
                 status.HTTP_404_NOT_FOUND,
@@ -470,20 +712,19 @@ class ItemResource(Resource):
             "Request to delete item %s for a shopcart id: %s", (item_id, shopcart_id)
         )
 
-        # Search for the shopcart
-        shopcart = ShopCart.find(shopcart_id)
-        if not shopcart:
+        # Search for the shopcart and its item in one query
+        found, item = ShopCart.find_item(shopcart_id, item_id=item_id)
+        if not found:
             abort(
                 status.HTTP_404_NOT_FOUND,
                 f"ShopCart with ID '{shopcart_id}' could not be found",
             )
 
-        item = ShopCartItem.find(item_id)
         if item:
             item.delete()
 
             # update the total price
-            shopcart.update_total_price()
+            ShopCart.update_totals([shopcart_id])
 
         return "", status.HTTP_204_NO_CONTENT
 
@@ -507,16 +748,19 @@ class ItemResource(Resource):
         )
         check_content_type("application/json")
 
-        # Search for the shopcart
-        shopcart = ShopCart.find(shopcart_id)
-        if not shopcart:
+        # Coalesce rapid updates in memory when write-behind is enabled
+        if app.config["WRITE_BEHIND_ENABLED"]:
+            return update_item_write_behind(shopcart_id, item_id), status.HTTP_200_OK
+
+        # Search for the shopcart and its item in one query
+        found, item = ShopCart.find_item(shopcart_id, item_id=item_id)
+        if not found:
             abort(
                 status.HTTP_404_NOT_FOUND,
                 f"ShopCart with ID '{shopcart_id}' could not be found",
             )
 
-        # See if the address exists and abort if it doesn't
-        item = ShopCartItem.find(item_id)
+        # See if the item exists and abort if it doesn't
         if not item:
             abort(
                 status.HTTP_404_NOT_FOUND,
@@ -529,7 +773,7 @@ class ItemResource(Resource):
         item.update()
 
         # update the total price
-        shopcart.update_total_price()
+        ShopCart.update_totals([shopcart_id])
 
         return item.serialize(), status.HTTP_200_OK
 
@@ -626,14 +870,16 @@ class ItemCollection(Resource):
         name = request.args.get("name")
         min_price = request.args.get("min_price")
         max_price = request.args.get("max_price")
+        low = to_cents(min_price) if min_price else None
+        high = to_cents(max_price) if max_price else None
 
         # pylint: disable=too-many-boolean-expressions
         filtered_items = []
         for item in shopcart.items:
             if (
                 (not name or item.name == name)
-                and (not min_price or item.price >= Decimal(min_price))
-                and (not max_price or item.price <= Decimal(max_price))
+                and (low is None or item.price >= low)
+                and (high is None or item.price <= high)
             ):
                 filtered_items.append(item)
 
@@ -674,16 +920,15 @@ class ProductResource(Resource):
             "Request to retrieve Item %s for ShopCart id: %s", (product_id, shopcart_id)
         )
 
-        # Search for the shopcart
-        shopcart = ShopCart.find(shopcart_id)
-        if not shopcart:
+        # Search for the shopcart and the product's item in one query
+        found, item = ShopCart.find_item(shopcart_id, product_id=product_id)
+        if not found:
             abort(
                 status.HTTP_404_NOT_FOUND,
                 f"ShopCart with ID '{shopcart_id}' could not be found",
             )
 
         # See if the item exists and abort if it doesn't
-        item = ShopCartItem.find_by_product_id(product_id)
         if not item:
             abort(
                 status.HTTP_404_NOT_FOUND,
@@ -693,6 +938,111 @@ class ProductResource(Resource):
         return item.serialize(), status.HTTP_200_OK
 
 
+######################################################################
+#  PATH: /products/{product_id}/carts
+######################################################################
+@api.route("/products/<int:product_id>/carts", strict_slashes=False)
+@api.param("product_id", "The Product identifier")
+class ProductCartsResource(Resource):
+    """Handles the ShopCarts that hold a product"""
+
+    # ------------------------------------------------------------------
+    # LIST SHOPCARTS HOLDING A PRODUCT
+    # ------------------------------------------------------------------
+    @api.doc("list_product_carts")
+    @api.expect(product_cart_args, validate=True)
+    @api.marshal_list_with(product_cart_model)
+    def get(self, product_id):
+        """
+        List the ShopCarts holding a product
+
+        This endpoint returns a page of ShopCarts ordered by id. The Link
+        header points to the next page while there are more ShopCarts.
+        """
+        args = product_cart_args.parse_args()
+        limit = min(max(args["limit"], 1), MAX_PAGE_SIZE)
+        app.logger.info("Request for ShopCarts holding product %s after %s", product_id, args["after"])
+
+        rows = ShopCart.find_by_product_id(product_id, args["after"], limit)
+        results = [
+            {
+                "id": shopcart.id,
+                "user_id": shopcart.user_id,
+                "name": shopcart.name,
+                "status": shopcart.status.name,
+                "total_price": to_amount(shopcart.total_price),
+                "quantity": quantity,
+            }
+            for shopcart, quantity in rows
+        ]
+        headers = {}
+        if len(results) == limit:
+            next_url = api.url_for(
+                ProductCartsResource,
+                product_id=product_id,
+                after=results[-1]["id"],
+                limit=limit,
+                _external=True,
+            )
+            headers["Link"] = f'<{next_url}>; rel="next"'
+        app.logger.info("Returning %d shopcarts", len(results))
+        return results, status.HTTP_200_OK, headers
+
+
+######################################################################
+# Reads the fields and items a ShopCart response should hold
+######################################################################
+def shopcart_view():
+    """Returns the (fields, include_items) asked for in the query string
+
+    fields is None when every field is wanted. The items are included
+    unless include_items=false, or fields or expand leave them out.
+    """
+    args = shopcart_view_args.parse_args()
+    names = None
+    if args["fields"]:
+        names = [name.strip() for name in args["fields"].split(",") if name.strip()]
+        unknown = set(names) - set(ShopCart.FIELDS) - {"items"}
+        if unknown:
+            error(
+                status.HTTP_400_BAD_REQUEST,
+                f"Unknown fields: {', '.join(sorted(unknown))}",
+            )
+        if "id" not in names:
+            names.insert(0, "id")
+
+    if args["expand"] is not None:
+        include_items = "items" in args["expand"].split(",")
+    elif args["include_items"] is not None:
+        include_items = args["include_items"]
+    else:
+        include_items = names is None or "items" in names
+    return names, include_items
+
+
+######################################################################
+# Continuation tokens of the change feed
+######################################################################
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def encode_change_token(changed_at, shopcart_id):
+    """Returns the opaque token of a position in the change feed"""
+    micros = (changed_at - EPOCH) // timedelta(microseconds=1)
+    return base64.urlsafe_b64encode(f"{micros}.{shopcart_id}".encode()).decode()
+
+
+def decode_change_token(token):
+    """Returns the (time, id) a change feed token points after"""
+    if not token:
+        return EPOCH, 0
+    try:
+        micros, shopcart_id = base64.urlsafe_b64decode(token.encode()).decode().split(".")
+        return EPOCH + timedelta(microseconds=int(micros)), int(shopcart_id)
+    except (ValueError, OverflowError):
+        return error(status.HTTP_400_BAD_REQUEST, f"Invalid since token '{token}'")
+
+
 ######################################################################
 # Checks the ContentType of a request
 ######################################################################
@@ -722,3 +1072,32 @@ def error(status_code, reason):
     """Logs the error and then aborts"""
     app.logger.error(reason)
     abort(status_code, reason)
+
+
+######################################################################
+# Buffers an Item update for a later write
+######################################################################
+def update_item_write_behind(shopcart_id, item_id):
+    """Merges an Item update into the write-behind buffer"""
+    buffer = get_buffer(app)
+    pending = buffer.get(shopcart_id, item_id) is not None
+    record_cache("write_behind", pending)
+    if not pending:
+        # Only the first update of a burst needs to check the database
+        found, item = ShopCart.find_item(shopcart_id, item_id=item_id)
+        if not found:
+            abort(
+                status.HTTP_404_NOT_FOUND,
+                f"ShopCart with ID '{shopcart_id}' could not be found",
+            )
+        if not item:
+            abort(
+                status.HTTP_404_NOT_FOUND,
+                f"Shopcart with id '{item_id}' could not be found.",
+            )
+
+    item = ShopCartItem()
+    item.deserialize(api.payload)
+    item.id = item_id
+    app.logger.info("Buffered update of Item %s for Shopcart %s", item_id, shopcart_id)
+    return buffer.put(shopcart_id, item_id, item.serialize())
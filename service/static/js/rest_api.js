@@ -31,6 +31,28 @@ $(function () {
         $("#flash_message").append(message);
     }
 
+    // Reloads the form whenever the server pushes a change of the shopcart
+    let shopcart_events = null;
+
+    function watch_shopcart(shopcart_id) {
+        if (shopcart_events) {
+            shopcart_events.close();
+            shopcart_events = null;
+        }
+        if (!shopcart_id || !window.EventSource) {
+            return;
+        }
+        shopcart_events = new EventSource(`${SHOPCART_SERVICE_BASE_URL}/${shopcart_id}/events`);
+        let reload = function() {
+            $.getJSON(`${SHOPCART_SERVICE_BASE_URL}/${shopcart_id}`)
+                .done(update_form_data)
+                .fail(clear_form_data);
+        };
+        ["create", "update", "delete", "resync"].forEach(function(name) {
+            shopcart_events.addEventListener(name, reload);
+        });
+    }
+
     // ****************************************
     // Create a Shopcart
     // ****************************************
@@ -131,11 +153,13 @@ $(function () {
         ajax.done(function(res){
             //alert(res.toSource())
             update_form_data(res)
+            watch_shopcart(res.id)
             flash_message("Success")
         });
 
         ajax.fail(function(res){
             clear_form_data()
+            watch_shopcart(null)
             flash_message(res.responseJSON.message)
         });
 
@@ -160,6 +184,7 @@ $(function () {
 
         ajax.done(function(res){
             clear_form_data()
+            watch_shopcart(null)
             flash_message("Shopcart has been Deleted!")
         });
 
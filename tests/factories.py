@@ -1,29 +1,11 @@
 """Test Factory"""
 
-from decimal import Decimal
-import random
 import factory
-from factory.fuzzy import FuzzyDecimal, FuzzyChoice
+from factory.fuzzy import FuzzyInteger, FuzzyChoice
 from service.models import ShopCart, ShopCartItem
 from service.models.shop_cart import ShopCartStatus
 
 
-class DecimalMine(factory.fuzzy.BaseFuzzyAttribute):
-    """Generates a random decimal number between low and high with precision."""
-
-    def __init__(self, low, high, precision="0.01"):
-        super().__init__()
-        self.low = Decimal(low)
-        self.high = Decimal(high)
-        self.precision = Decimal(precision)
-
-    def fuzz(self):
-        value = Decimal(random.uniform(float(self.low), float(self.high))).quantize(
-            self.precision
-        )
-        return value
-
-
 # pylint: disable=too-few-public-methods
 class ShopCartFactory(factory.Factory):
     """Creates fake shop cart instances"""
@@ -36,7 +18,8 @@ class ShopCartFactory(factory.Factory):
     id = factory.Sequence(lambda n: n)
     user_id = factory.Sequence(lambda n: n)
     name = factory.Sequence(lambda n: f"sc-{n}")
-    total_price = DecimalMine(0.00, 200.00)
+    # Prices are in cents
+    total_price = FuzzyInteger(0, 20000)
     status = FuzzyChoice(
         choices=[ShopCartStatus.ACTIVE, ShopCartStatus.PENDING, ShopCartStatus.INACTIVE]
     )
@@ -66,5 +49,5 @@ class ShopCartItemFactory(factory.Factory):
     name = factory.Sequence(lambda n: f"i-{n}")
     product_id = factory.Sequence(lambda n: n)
     quantity = factory.Sequence(lambda n: n)
-    price = FuzzyDecimal(0.00, 10.00)
+    price = FuzzyInteger(0, 1000)
     shop_cart = factory.SubFactory(ShopCartFactory)
@@ -0,0 +1,120 @@
+"""
+Admission Control Test Suite
+"""
+
+import time
+import threading
+from unittest import TestCase
+from flask import Flask
+from service.common import status
+from service.common.admission import (
+    HIGH,
+    LOW,
+    AdmissionController,
+    init_admission,
+    upstream_wait,
+)
+
+
+def make_app(**config):
+    """Creates an app with stand-in routes behind admission control"""
+    app = Flask("admissiontest")
+    app.config.update(
+        ADMISSION_MAX_IN_FLIGHT=1,
+        ADMISSION_QUEUE_SIZE=4,
+        ADMISSION_QUEUE_BUDGET_MS=200,
+        ADMISSION_HEAVY_ENDPOINTS="shopcart_collection",
+    )
+    app.config.update(config)
+    app.add_url_rule("/api/shopcarts", "shopcart_collection", lambda: "[]")
+    app.add_url_rule("/health", "health", lambda: "OK")
+    init_admission(app)
+    return app
+
+
+######################################################################
+#  T E S T   C A S E S
+######################################################################
+class TestAdmission(TestCase):
+    """Admission Control Tests"""
+
+    def test_admit_under_limit(self):
+        """It should admit requests up to the limit"""
+        controller = AdmissionController(2, 4)
+        self.assertIsNone(controller.acquire(HIGH, 0.1))
+        self.assertIsNone(controller.acquire(HIGH, 0.1))
+        self.assertEqual(controller.acquire(HIGH, 0.01), "deadline")
+        controller.release()
+        self.assertIsNone(controller.acquire(HIGH, 0.1))
+        self.assertEqual(controller.in_flight, 2)
+
+    def test_queue_full(self):
+        """It should reject at once when the queue is full"""
+        controller = AdmissionController(1, 0)
+        controller.acquire(HIGH, 0.1)
+        self.assertEqual(controller.acquire(HIGH, 0.1), "queue_full")
+
+    def test_overloaded(self):
+        """It should shed at once when the average wait is over the budget"""
+        controller = AdmissionController(1, 4)
+        controller.acquire(HIGH, 0.1)
+        controller.avg_wait = 1.0
+        self.assertEqual(controller.acquire(HIGH, 0.1), "overloaded")
+
+    def test_priority(self):
+        """It should hand a free slot to cheap requests before heavy ones"""
+        controller = AdmissionController(1, 4)
+        controller.acquire(HIGH, 1.0)
+        order = []
+
+        def wait(name, priority):
+            if controller.acquire(priority, 2.0) is None:
+                order.append(name)
+
+        heavy = threading.Thread(target=wait, args=("heavy", LOW))
+        heavy.start()
+        while len(controller.waiters) < 1:
+            time.sleep(0.001)
+        cheap = threading.Thread(target=wait, args=("cheap", HIGH))
+        cheap.start()
+        while len(controller.waiters) < 2:
+            time.sleep(0.001)
+        controller.release()
+        cheap.join()
+        controller.release()
+        heavy.join()
+        self.assertEqual(order, ["cheap", "heavy"])
+        controller.release()
+        self.assertEqual(controller.in_flight, 0)
+
+    def test_upstream_wait(self):
+        """It should read the time spent in front of the worker"""
+        now = time.time()
+        self.assertAlmostEqual(upstream_wait(f"t={now - 2:.3f}"), 2.0, places=1)
+        self.assertAlmostEqual(upstream_wait(str(int((now - 1) * 1000))), 1.0, places=1)
+        self.assertAlmostEqual(upstream_wait(str(int((now - 1) * 1e6))), 1.0, places=1)
+        self.assertEqual(upstream_wait("garbage"), 0.0)
+
+    def test_shed_request(self):
+        """It should answer 503 when no slot frees up in time"""
+        app = make_app()
+        client = app.test_client()
+        self.assertEqual(client.get("/api/shopcarts").status_code, status.HTTP_200_OK)
+        app.extensions["admission"].acquire(HIGH, 0.1)
+        resp = client.get("/api/shopcarts")
+        self.assertEqual(resp.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(resp.headers["Retry-After"], "1")
+        # Health checks are never shed
+        self.assertEqual(client.get("/health").status_code, status.HTTP_200_OK)
+
+    def test_shed_upstream(self):
+        """It should shed a request that spent its budget before the worker"""
+        client = make_app().test_client()
+        resp = client.get("/api/shopcarts", headers={"X-Request-Start": f"t={time.time() - 5}"})
+        self.assertEqual(resp.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+
+    def test_disabled(self):
+        """It should not limit anything when disabled"""
+        app = make_app(ADMISSION_MAX_IN_FLIGHT=0)
+        self.assertNotIn("admission", app.extensions)
+        self.assertEqual(app.test_client().get("/api/shopcarts").status_code, status.HTTP_200_OK)
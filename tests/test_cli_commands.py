@@ -3,13 +3,20 @@ CLI Command Extensions for Flask
 """
 
 import os
+import json
+import tempfile
 from unittest import TestCase
 from unittest.mock import patch, MagicMock
 from click.testing import CliRunner
 
 # pylint: disable=unused-import
 from wsgi import app  # noqa: F401
-from service.common.cli_commands import db_create  # noqa: E402
+from service.common.cli_commands import (  # noqa: E402
+    db_create,
+    db_upgrade,
+    startup_profile,
+    swagger_export,
+)
 
 
 class TestFlaskCLI(TestCase):
@@ -25,3 +32,46 @@ class TestFlaskCLI(TestCase):
         with patch.dict(os.environ, {"FLASK_APP": "wsgi:app"}, clear=True):
             result = self.runner.invoke(db_create)
             self.assertEqual(result.exit_code, 0)
+
+    @patch("service.common.cli_commands.SchemaVersion")
+    @patch("service.common.cli_commands.db")
+    def test_db_create_stamps_version(self, db_mock, version_mock):
+        """It should stamp the schema version after creating the tables"""
+        result = self.runner.invoke(db_create)
+        self.assertEqual(result.exit_code, 0)
+        db_mock.create_all.assert_called_once()
+        version_mock.stamp.assert_called_once()
+
+    @patch("service.common.cli_commands.SchemaVersion")
+    @patch("service.common.cli_commands.db")
+    def test_db_upgrade(self, db_mock, version_mock):
+        """It should run the migrations from the stamped version"""
+        version_mock.current.return_value = 1
+        result = self.runner.invoke(db_upgrade)
+        self.assertEqual(result.exit_code, 0)
+        db_mock.create_all.assert_called_once()
+        version_mock.upgrade.assert_called_once_with(1)
+
+    def test_swagger_export(self):
+        """It should write the Swagger spec to a file"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "swagger.json")
+            result = self.runner.invoke(swagger_export, [path])
+            self.assertEqual(result.exit_code, 0)
+            with open(path, encoding="utf-8") as file:
+                self.assertIn("/shopcarts", json.load(file)["paths"])
+
+    @patch("service.api", None)
+    def test_swagger_export_without_routes(self):
+        """It should refuse to export without the routes"""
+        result = self.runner.invoke(swagger_export, ["swagger.json"])
+        self.assertEqual(result.exit_code, 1)
+
+    @patch("service.common.cli_commands.import_profile")
+    def test_startup_profile(self, profile_mock):
+        """It should print the slowest imports and the boot phases"""
+        profile_mock.return_value = [(120.5, 3.2, "flask_restx")]
+        result = self.runner.invoke(startup_profile, ["--top", "1"])
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn("flask_restx", result.output)
+        self.assertIn("routes=", result.output)
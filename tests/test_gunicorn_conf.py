@@ -0,0 +1,115 @@
+"""
+Gunicorn Configuration Test Suite
+"""
+
+import os
+import runpy
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch, MagicMock
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), "gunicorn.conf.py")
+
+
+def write(path, text):
+    """Writes a cgroup file"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as file:
+        file.write(text)
+
+
+######################################################################
+#  T E S T   C A S E S
+######################################################################
+class TestGunicornConf(TestCase):
+    """Gunicorn Configuration Tests"""
+
+    def setUp(self):
+        self.conf = runpy.run_path(CONFIG_FILE)
+
+    def test_cpu_limit_v2(self):
+        """It should read the CPU quota from cgroup v2"""
+        with tempfile.TemporaryDirectory() as root:
+            write(os.path.join(root, "cpu.max"), "50000 100000\n")
+            self.assertEqual(self.conf["cpu_limit"](root), 0.5)
+            write(os.path.join(root, "cpu.max"), "max 100000\n")
+            self.assertEqual(self.conf["cpu_limit"](root), float(os.cpu_count()))
+
+    def test_cpu_limit_v1(self):
+        """It should read the CPU quota from cgroup v1"""
+        with tempfile.TemporaryDirectory() as root:
+            write(os.path.join(root, "cpu", "cpu.cfs_quota_us"), "150000\n")
+            write(os.path.join(root, "cpu", "cpu.cfs_period_us"), "100000\n")
+            self.assertEqual(self.conf["cpu_limit"](root), 1.5)
+
+    def test_cpu_limit_without_cgroup(self):
+        """It should use the CPU count without a quota"""
+        with tempfile.TemporaryDirectory() as root:
+            self.assertEqual(self.conf["cpu_limit"](root), float(os.cpu_count()))
+
+    def test_worker_counts(self):
+        """It should size the workers from the CPU limit"""
+        worker_counts = self.conf["worker_counts"]
+        self.assertEqual(worker_counts("sync", 0.5), (3, 1))
+        self.assertEqual(worker_counts("gthread", 0.5), (1, 4))
+        self.assertEqual(worker_counts("gevent", 2.5), (3, 4))
+
+    def test_settings_from_environment(self):
+        """It should read the worker class and counts from the environment"""
+        env = {"GUNICORN_WORKER_CLASS": "sync", "GUNICORN_WORKERS": "7", "GUNICORN_PRELOAD": "false"}
+        with patch.dict(os.environ, env):
+            conf = runpy.run_path(CONFIG_FILE)
+        self.assertEqual(conf["worker_class"], "sync")
+        self.assertEqual(conf["workers"], 7)
+        self.assertFalse(conf["preload_app"])
+
+    @patch("gc.freeze")
+    def test_fork_hooks(self, freeze_mock):
+        """It should release connections around fork and flush on exit"""
+        from wsgi import app  # pylint: disable=import-outside-toplevel
+
+        server = MagicMock()
+        server.app.wsgi.return_value = app
+        worker = MagicMock(wsgi=app)
+        with patch("service.common.log_handlers.restart_listener") as restart_mock:
+            self.conf["when_ready"](server)
+            self.conf["post_fork"](server, worker)
+            restart_mock.assert_called_once_with(app)
+        freeze_mock.assert_called_once()
+        with patch("service.common.log_handlers.stop_listener") as stop_mock:
+            self.conf["worker_exit"](server, worker)
+        stop_mock.assert_called_once()
+
+    def test_hooks_without_preload(self):
+        """It should leave the workers alone when the app is not preloaded"""
+        server = MagicMock()
+        server.cfg.preload_app = False
+        self.conf["when_ready"](server)
+        self.conf["post_fork"](server, MagicMock())
+        self.conf["worker_exit"](server, MagicMock(spec=[]))
+        server.app.wsgi.assert_not_called()
+
+    def test_post_request_recycles(self):
+        """It should stop the worker gracefully when the watchdog asks for it"""
+        watchdog = MagicMock(recycle=False)
+        worker = MagicMock(alive=True)
+        worker.wsgi.extensions = {"memory_watchdog": watchdog}
+        self.conf["post_request"](worker, None, {}, None)
+        self.assertTrue(worker.alive)
+        watchdog.recycle = True
+        self.conf["post_request"](worker, None, {}, None)
+        self.assertFalse(worker.alive)
+        self.conf["post_request"](MagicMock(spec=[]), None, {}, None)
+
+    def test_max_requests_jitter(self):
+        """It should recycle workers after a jittered number of requests"""
+        with patch.dict(os.environ, {"GUNICORN_MAX_REQUESTS": "500", "GUNICORN_MAX_REQUESTS_JITTER": "50"}):
+            conf = runpy.run_path(CONFIG_FILE)
+        self.assertEqual((conf["max_requests"], conf["max_requests_jitter"]), (500, 50))
+
+    @patch("prometheus_client.multiprocess.mark_process_dead")
+    def test_child_exit(self, mark_mock):
+        """It should mark dead workers in the Prometheus files"""
+        with patch.dict(os.environ, {"PROMETHEUS_MULTIPROC_DIR": "/tmp"}):
+            self.conf["child_exit"](MagicMock(), MagicMock(pid=42))
+        mark_mock.assert_called_once_with(42)
@@ -0,0 +1,138 @@
+"""
+Log Handlers Test Suite
+"""
+
+import io
+import sys
+import json
+import logging
+from unittest import TestCase
+from flask import Flask
+from prometheus_client import REGISTRY
+from service.common.log_handlers import (
+    DroppingQueueHandler,
+    JsonFormatter,
+    SamplingFilter,
+    init_logging,
+    parse_sample_rates,
+    restart_listener,
+    stop_listener,
+    MODEL_LOGGER,
+)
+
+
+def make_record(name="service", level=logging.INFO, msg="hello %s", args=("world",)):
+    """Builds a log record"""
+    return logging.LogRecord(name, level, __file__, 1, msg, args, None)
+
+
+######################################################################
+#  T E S T   C A S E S
+######################################################################
+class TestLogHandlers(TestCase):
+    """Log Handlers Tests"""
+
+    def setUp(self):
+        """Saves the model logger set up by the service"""
+        model_logger = logging.getLogger(MODEL_LOGGER)
+        self.saved = (model_logger.handlers, model_logger.filters, model_logger.level)
+
+    def tearDown(self):
+        """Restores the model logger"""
+        model_logger = logging.getLogger(MODEL_LOGGER)
+        model_logger.handlers, model_logger.filters, level = self.saved
+        model_logger.setLevel(level)
+
+    def test_json_formatter(self):
+        """It should format a record as a JSON line"""
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            record = make_record()
+            record.exc_info = sys.exc_info()
+        entry = json.loads(JsonFormatter().format(record))
+        self.assertEqual(entry["message"], "hello world")
+        self.assertEqual(entry["level"], "INFO")
+        self.assertEqual(entry["logger"], "service")
+        self.assertIn("ValueError: boom", entry["exception"])
+
+    def test_sampling_filter(self):
+        """It should sample INFO records per logger and keep warnings"""
+        sampler = SamplingFilter({"noisy": 0.0})
+        self.assertFalse(sampler.filter(make_record("noisy")))
+        self.assertTrue(sampler.filter(make_record("noisy", logging.WARNING)))
+        self.assertTrue(sampler.filter(make_record("quiet")))
+
+    def test_parse_sample_rates(self):
+        """It should parse logger sample rates"""
+        self.assertEqual(
+            parse_sample_rates("flask.app=0.1, service = 0.5,"),
+            {"flask.app": 0.1, "service": 0.5},
+        )
+        self.assertEqual(parse_sample_rates(""), {})
+
+    def test_queue_drops_when_full(self):
+        """It should drop records instead of blocking when the queue is full"""
+        dropped = REGISTRY.get_sample_value("shopcarts_log_records_dropped_total")
+        handler = DroppingQueueHandler(1)
+        handler.handle(make_record())
+        handler.handle(make_record())
+        self.assertEqual(handler.queue.qsize(), 1)
+        self.assertEqual(handler.dropped, 1)
+        self.assertEqual(REGISTRY.get_sample_value("shopcarts_log_records_dropped_total"), dropped + 1)
+
+    def test_init_async_logging(self):
+        """It should write app records as JSON lines from a background thread"""
+        stream = io.StringIO()
+        target = logging.getLogger("test.gunicorn")
+        target.handlers = [logging.StreamHandler(stream)]
+        target.setLevel(logging.INFO)
+        app = Flask("logtest")
+        app.config.update(
+            LOG_FORMAT="json",
+            LOG_ASYNC=True,
+            LOG_QUEUE_SIZE=100,
+            LOG_SAMPLE_RATES="logtest=0.0",
+        )
+        init_logging(app, "test.gunicorn")
+        app.logger.warning("kept %d", 1)
+        app.logger.info("sampled out")
+        stop_listener(app.extensions["log_listener"])
+        stop_listener(app.extensions["log_listener"])
+        lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual([line["message"] for line in lines], ["kept 1"])
+        self.assertEqual(app.extensions["log_queue"].dropped, 0)
+
+    def test_restart_listener(self):
+        """It should start a new listener with an empty queue after a fork"""
+        stream = io.StringIO()
+        target = logging.getLogger("test.fork")
+        target.handlers = [logging.StreamHandler(stream)]
+        target.setLevel(logging.INFO)
+        app = Flask("forktest")
+        app.config.update(LOG_FORMAT="json", LOG_ASYNC=True, LOG_QUEUE_SIZE=100)
+        init_logging(app, "test.fork")
+        stop_listener(app.extensions["log_listener"])
+        old_queue = app.extensions["log_queue"].queue
+        restart_listener(app)
+        self.assertIsNot(app.extensions["log_queue"].queue, old_queue)
+        app.logger.info("after fork")
+        stop_listener(app.extensions["log_listener"])
+        self.assertIn("after fork", stream.getvalue())
+
+    def test_restart_listener_sync(self):
+        """It should not start a listener when logging is synchronous"""
+        app = Flask("nolistener")
+        restart_listener(app)
+        self.assertNotIn("log_listener", app.extensions)
+
+    def test_init_sync_logging(self):
+        """It should write text lines directly when async logging is off"""
+        stream = io.StringIO()
+        target = logging.getLogger("test.sync")
+        target.handlers = [logging.StreamHandler(stream)]
+        target.setLevel(logging.INFO)
+        app = Flask("synctest")
+        app.config.update(LOG_FORMAT="text", LOG_ASYNC=False)
+        init_logging(app, "test.sync")
+        self.assertIn("[INFO] [log_handlers] Logging handler established", stream.getvalue())
@@ -0,0 +1,159 @@
+"""
+Rate Limiting Test Suite
+"""
+
+import os
+from unittest import TestCase
+from unittest.mock import patch
+import fakeredis
+from flask import Flask
+from service.common import status
+from service.common.rate_limit import (
+    MemoryStore,
+    RedisStore,
+    SharedMemoryStore,
+    init_rate_limit,
+    make_store,
+    parse_limits,
+    refill,
+)
+
+
+def make_app(**config):
+    """Creates an app with stand-in write routes behind the rate limiter"""
+    app = Flask("ratetest")
+    app.config.update(
+        RATE_LIMIT_ENABLED=True,
+        RATE_LIMITS="item_write=2:1,cart_write=1:0.5",
+        RATE_LIMIT_STORE="memory",
+        RATE_LIMIT_SHARED_SLOTS=64,
+    )
+    app.config.update(config)
+    app.add_url_rule(
+        "/shopcarts/<int:shopcart_id>/items",
+        "item_collection",
+        lambda shopcart_id: ("", status.HTTP_201_CREATED),
+        methods=["POST", "GET"],
+    )
+    app.add_url_rule(
+        "/shopcarts", "shopcart_collection", lambda: ("", status.HTTP_201_CREATED), methods=["POST"]
+    )
+    init_rate_limit(app)
+    return app
+
+
+######################################################################
+#  T E S T   C A S E S
+######################################################################
+class TestRateLimit(TestCase):
+    """Rate Limiting Tests"""
+
+    def test_parse_limits(self):
+        """It should parse the buckets of each route group"""
+        self.assertEqual(
+            parse_limits("item_write=20:5, cart_write=10:0.5,"),
+            {"item_write": (20.0, 5.0), "cart_write": (10.0, 0.5)},
+        )
+
+    def test_refill(self):
+        """It should refill a bucket over time up to its burst"""
+        self.assertEqual(refill(0.0, 0.0, 10.0, 5, 1), (4.0, 0.0))
+        tokens, wait = refill(0.5, 0.0, 0.0, 5, 2)
+        self.assertEqual((tokens, wait), (0.5, 0.25))
+
+    def test_memory_store(self):
+        """It should allow the burst and then ask to wait"""
+        store = MemoryStore()
+        with patch("time.monotonic", return_value=100.0):
+            self.assertEqual(store.take("cart:1", 2, 1), 0)
+            self.assertEqual(store.take("cart:1", 2, 1), 0)
+            self.assertAlmostEqual(store.take("cart:1", 2, 1), 1.0)
+            self.assertEqual(store.take("cart:2", 2, 1), 0)
+        with patch("time.monotonic", return_value=101.0):
+            self.assertEqual(store.take("cart:1", 2, 1), 0)
+
+    def test_shared_memory_store(self):
+        """It should share buckets with forked workers"""
+        store = SharedMemoryStore(64)
+        self.assertEqual(store.take("cart:1", 1, 0.001), 0)
+        pid = os.fork()
+        if pid == 0:  # pragma: no cover
+            os._exit(0 if store.take("cart:1", 1, 0.001) > 0 else 1)
+        _, code = os.waitpid(pid, 0)
+        self.assertEqual(os.waitstatus_to_exitcode(code), 0)
+
+    def test_shared_memory_collision(self):
+        """It should give a full bucket to a key that takes over a slot"""
+        store = SharedMemoryStore(1)
+        self.assertEqual(store.take("cart:1", 1, 0.001), 0)
+        self.assertGreater(store.take("cart:1", 1, 0.001), 0)
+        self.assertEqual(store.take("cart:2", 1, 0.001), 0)
+
+    @patch("redis.Redis.from_url", fakeredis.FakeRedis.from_url)
+    def test_redis_store(self):
+        """It should run the token bucket script in the Redis server"""
+        store = RedisStore("redis://localhost:6379/0")
+        with patch("time.time", return_value=100.0):
+            self.assertEqual(store.take("cart:1", 2, 1), 0)
+            self.assertEqual(store.take("cart:1", 2, 1), 0)
+            self.assertAlmostEqual(store.take("cart:1", 2, 1), 1.0)
+            self.assertEqual(store.take("cart:2", 2, 1), 0)
+            # an idle bucket is gone once it would be full again
+            self.assertEqual(store.client.ttl("ratelimit:cart:1"), 3)
+        with patch("time.time", return_value=100.5):
+            self.assertAlmostEqual(store.take("cart:1", 2, 1), 0.5)
+        with patch("time.time", return_value=101.5):
+            self.assertEqual(store.take("cart:1", 2, 1), 0)
+        # a host whose clock is behind neither adds tokens nor rewinds the bucket
+        with patch("time.time", return_value=90.0):
+            self.assertAlmostEqual(store.take("cart:1", 2, 1), 0.5)
+            self.assertEqual(float(store.client.hget("ratelimit:cart:1", "updated")), 101.5)
+
+    @patch("redis.Redis.from_url", fakeredis.FakeRedis.from_url)
+    def test_too_many_requests_redis(self):
+        """It should answer 429 from the buckets in Redis"""
+        app = make_app(RATE_LIMIT_STORE="redis://localhost:6379/1")
+        self.assertIsInstance(app.extensions["rate_limit"], RedisStore)
+        client = app.test_client()
+        for _ in range(2):
+            self.assertEqual(client.post("/shopcarts/9/items").status_code, status.HTTP_201_CREATED)
+        resp = client.post("/shopcarts/9/items")
+        self.assertEqual(resp.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(resp.headers["Retry-After"], "1")
+
+    def test_make_store(self):
+        """It should create the store named in the configuration"""
+        self.assertIsInstance(make_store(make_app()), MemoryStore)
+        self.assertIsInstance(make_store(make_app(RATE_LIMIT_STORE="shared")), SharedMemoryStore)
+        self.assertRaises(ValueError, make_store, make_app(RATE_LIMIT_ENABLED=False, RATE_LIMIT_STORE="disk"))
+
+    def test_too_many_requests(self):
+        """It should answer 429 with Retry-After once the bucket is empty"""
+        client = make_app().test_client()
+        for _ in range(2):
+            self.assertEqual(client.post("/shopcarts/1/items").status_code, status.HTTP_201_CREATED)
+        resp = client.post("/shopcarts/1/items")
+        self.assertEqual(resp.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(resp.headers["Retry-After"], "1")
+        self.assertEqual(resp.get_json()["error"], "Too Many Requests")
+        # Other carts and read routes have their own budget
+        self.assertEqual(client.post("/shopcarts/2/items").status_code, status.HTTP_201_CREATED)
+        self.assertEqual(client.get("/shopcarts/1/items").status_code, status.HTTP_201_CREATED)
+
+    def test_keyed_by_user(self):
+        """It should count new carts against the user in the body"""
+        client = make_app().test_client()
+        self.assertEqual(client.post("/shopcarts", json={"user_id": 7}).status_code, status.HTTP_201_CREATED)
+        resp = client.post("/shopcarts", json={"user_id": 7})
+        self.assertEqual(resp.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(resp.headers["Retry-After"], "2")
+        self.assertEqual(client.post("/shopcarts", json={"user_id": 8}).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(client.post("/shopcarts").status_code, status.HTTP_201_CREATED)
+
+    def test_disabled(self):
+        """It should not limit anything when disabled"""
+        app = make_app(RATE_LIMIT_ENABLED=False)
+        self.assertNotIn("rate_limit", app.extensions)
+        client = app.test_client()
+        for _ in range(5):
+            self.assertEqual(client.post("/shopcarts/1/items").status_code, status.HTTP_201_CREATED)
@@ -106,7 +106,7 @@ class TestShopCartService(TestCase):
         self.assertEqual(new_shopcart["name"], shopcart.name, "name does not match")
         self.assertEqual(
             float(new_shopcart["total_price"]),
-            float(shopcart.total_price),
+            shopcart.total_price / 100,
             "total_price does not match",
         )
 
@@ -120,7 +120,7 @@ class TestShopCartService(TestCase):
         )
         self.assertEqual(
             float(new_shopcart["total_price"]),
-            float(shopcart.total_price),
+            shopcart.total_price / 100,
             "total_price does not match",
         )
         self.assertEqual(new_shopcart["items"], shopcart.items, "items does not match")
@@ -406,7 +406,7 @@ class TestShopCartService(TestCase):
         self.assertEqual(data["product_id"], item.product_id)
         self.assertEqual(data["shop_cart_id"], shop_cart.id)
         self.assertEqual(data["quantity"], item.quantity)
-        self.assertEqual(data["price"], float(item.price))
+        self.assertEqual(data["price"], item.price / 100)
 
     def test_create_shopcart_duplicate_items(self):
         """when adding an item to a shop cart,
@@ -463,7 +463,7 @@ class TestShopCartService(TestCase):
         self.assertEqual(data["name"], item.name)
         self.assertEqual(data["product_id"], item.product_id)
         self.assertEqual(data["quantity"], item.quantity)
-        self.assertEqual(data["price"], float(item.price))
+        self.assertEqual(data["price"], item.price / 100)
 
     def test_get_shopcart_item_when_no_shopcart(self):
         """It should Get an error when a shopcart id does not exist
@@ -518,7 +518,7 @@ class TestShopCartService(TestCase):
         self.assertEqual(data["name"], item.name)
         self.assertEqual(data["product_id"], item.product_id)
         self.assertEqual(data["quantity"], item.quantity)
-        self.assertEqual(data["price"], float(item.price))
+        self.assertEqual(data["price"], item.price / 100)
 
         # when shopcart does not exist
         resp = self.client.get(
@@ -531,6 +531,60 @@ class TestShopCartService(TestCase):
             resp.data.decode(),
         )
 
+    def test_get_product_scoped_to_shopcart(self):
+        """It should only find a product among the items of the given shopcart"""
+        shopcarts = self._create_shopcarts(2)
+        first, second = shopcarts[0], shopcarts[1]
+        item = ShopCartItemFactory(product_id=4242)
+        resp = self.client.post(f"{BASE_URL_ITEM}/{first.id}/items", json=item.serialize())
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+
+        resp = self.client.get(f"{BASE_URL_ITEM}/{second.id}/products/4242")
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+        resp = self.client.get(f"{BASE_URL_ITEM}/{first.id}/products/4242")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.get_json()["shop_cart_id"], first.id)
+
+    def test_get_item_of_another_shopcart(self):
+        """It should not find an item through a shopcart it does not belong to"""
+        shopcarts = self._create_shopcarts(2)
+        item = ShopCartItemFactory()
+        resp = self.client.post(f"{BASE_URL_ITEM}/{shopcarts[0].id}/items", json=item.serialize())
+        item_id = resp.get_json()["id"]
+        resp = self.client.get(f"{BASE_URL_ITEM}/{shopcarts[1].id}/items/{item_id}")
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertIn(f"Item with id '{item_id}' could not be found", resp.get_data(as_text=True))
+
+    def test_list_product_carts(self):
+        """It should list the shopcarts holding a product a page at a time"""
+        shopcarts = self._create_shopcarts(3)
+        for shopcart in shopcarts:
+            for name in ("first", "second"):
+                item = ShopCartItemFactory(product_id=77, name=f"{name}-{shopcart.id}", quantity=1)
+                self.client.post(f"{BASE_URL_ITEM}/{shopcart.id}/items", json=item.serialize())
+        item = ShopCartItemFactory(product_id=78, name="other")
+        self.client.post(f"{BASE_URL_ITEM}/{shopcarts[0].id}/items", json=item.serialize())
+
+        resp = self.client.get("/api/products/77/carts", query_string={"limit": 2})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        data = resp.get_json()
+        self.assertEqual([cart["id"] for cart in data], sorted(cart.id for cart in shopcarts)[:2])
+        self.assertEqual(data[0]["quantity"], 2)
+        self.assertEqual(data[0]["user_id"], shopcarts[0].user_id)
+        self.assertIn('rel="next"', resp.headers["Link"])
+
+        next_url = resp.headers["Link"].split(">")[0].lstrip("<")
+        resp = self.client.get(next_url)
+        data = resp.get_json()
+        self.assertEqual([cart["id"] for cart in data], [max(cart.id for cart in shopcarts)])
+        self.assertNotIn("Link", resp.headers)
+
+    def test_list_product_carts_empty(self):
+        """It should return an empty list for a product no shopcart holds"""
+        resp = self.client.get("/api/products/12345/carts")
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.get_json(), [])
+
     def test_delete_shopcart_item(self):
         """It should delete a shopcart item"""
         shopcart = self._create_shopcarts(1)[0]
@@ -827,7 +881,7 @@ class TestShopCartService(TestCase):
         data = resp.get_json()
         self.assertEqual(
             data["total_price"],
-            float(item_1.price * item_1.quantity + item_2.price * item_2.quantity),
+            (item_1.price * item_1.quantity + item_2.price * item_2.quantity) / 100,
         )
 
     def test_shopcart_total_price_with_delete_item(self):
@@ -875,7 +929,7 @@ class TestShopCartService(TestCase):
         )
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
         data = resp.get_json()
-        self.assertEqual(data["total_price"], float(item_2.price * item_2.quantity))
+        self.assertEqual(data["total_price"], item_2.price * item_2.quantity / 100)
 
     def test_shopcart_total_price_with_update_item(self):
         """
@@ -911,7 +965,7 @@ class TestShopCartService(TestCase):
         )
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
         data = resp.get_json()
-        self.assertEqual(data["total_price"], float(item.price * 3))
+        self.assertEqual(data["total_price"], item.price * 3 / 100)
 
     def test_read_health(self):
         """It should return 200 status and OK
@@ -5,6 +5,7 @@ Test cases for ShopCart Model
 
 import os
 import logging
+from decimal import Decimal
 from unittest import TestCase
 from unittest.mock import patch
 from wsgi import app
@@ -15,6 +16,7 @@ from service.models import (
     # ShopCartStatus,
     ShopCartItem,
 )
+from service.models.persistent_base import to_amount, to_cents
 from tests.factories import ShopCartFactory, ShopCartItemFactory
 
 DATABASE_URI = os.getenv(
@@ -63,7 +65,7 @@ class TestShopCart(TestCase):
         fake_cart_dict = {
             "user_id": fake_cart.user_id,
             "name": fake_cart.name,
-            "total_price": fake_cart.total_price,
+            "total_price": fake_cart.total_price / 100,
             "status": fake_cart.status,
         }
         cart = ShopCart()
@@ -119,13 +121,13 @@ class TestShopCart(TestCase):
         logging.debug(shop_cart)
         self.assertIsNotNone(shop_cart.id)
         # Update shop cart
-        shop_cart.total_price = 250.00
+        shop_cart.total_price = 25000
         shop_cart.update()
-        self.assertEqual(shop_cart.total_price, 250.00)
+        self.assertEqual(shop_cart.total_price, 25000)
         shop_carts = ShopCart.all()
         self.assertEqual(len(shop_carts), 1)
         self.assertEqual(shop_carts[0].id, shop_cart.id)
-        self.assertEqual(shop_carts[0].total_price, 250.00)
+        self.assertEqual(shop_carts[0].total_price, 25000)
 
     def test_delete_a_shopcart(self):
         """It should Delete a shopcart from the database"""
@@ -173,25 +175,26 @@ class TestShopCart(TestCase):
         self.assertEqual(data["id"], shop_cart.id)
         self.assertEqual(data["user_id"], shop_cart.user_id)
         self.assertEqual(data["name"], shop_cart.name)
-        self.assertEqual(data["total_price"], float(shop_cart.total_price))
+        self.assertEqual(data["total_price"], shop_cart.total_price / 100)
         self.assertEqual(len(data["items"]), 1)
         items = data["items"]
         self.assertEqual(items[0]["id"], shop_cart_item.id)
         self.assertEqual(items[0]["product_id"], shop_cart_item.product_id)
         self.assertEqual(items[0]["shop_cart_id"], shop_cart_item.shop_cart_id)
         self.assertEqual(items[0]["quantity"], shop_cart_item.quantity)
-        self.assertEqual(items[0]["price"], float(shop_cart_item.price))
+        self.assertEqual(items[0]["price"], shop_cart_item.price / 100)
 
     def test_deserialize_shop_cart(self):
         """It should deserialize a Shop Cart"""
-        data = ShopCartFactory().serialize()
+        fake_cart = ShopCartFactory()
+        data = fake_cart.serialize()
         shop_cart = ShopCart()
         shop_cart.deserialize(data)
         self.assertNotEqual(shop_cart, None)
         self.assertEqual(shop_cart.id, None)
         self.assertEqual(shop_cart.user_id, data["user_id"])
         self.assertEqual(shop_cart.name, data["name"])
-        self.assertEqual(shop_cart.total_price, data["total_price"])
+        self.assertEqual(shop_cart.total_price, fake_cart.total_price)
 
     def test_deserialize_shop_cart_item(self):
         """It should deserialize a Shop Cart item"""
@@ -235,12 +238,93 @@ class TestShopCart(TestCase):
         self.assertRaises(DataValidationError, sc.deserialize, data)
 
 
+######################################################################
+#  T O T A L S  T E S T   C A S E S
+######################################################################
+class TestShopCartTotals(TestCase):
+    """Shop Cart Total Price Tests"""
+
+    def setUp(self):
+        """This runs before each test"""
+        db.session.query(ShopCartItem).delete()
+        db.session.query(ShopCart).delete()
+        db.session.commit()
+
+    def tearDown(self):
+        """This runs after each test"""
+        db.session.remove()
+
+    def test_update_total_price(self):
+        """It should compute the total price in the database"""
+        shop_cart = ShopCartFactory()
+        shop_cart.create()
+        for price, quantity in ((125, 2), (1000, 3)):
+            ShopCartItemFactory(shop_cart=shop_cart, price=price, quantity=quantity).create()
+        db.session.expire_all()
+        shop_cart = ShopCart.find(shop_cart.id)
+        shop_cart.update_total_price()
+        self.assertEqual(shop_cart.total_price, 3250)
+        # the items were never loaded
+        self.assertNotIn("items", ShopCart.find(shop_cart.id).__dict__)
+
+    def test_update_total_price_empty(self):
+        """It should set the total price of an empty Shop Cart to zero"""
+        shop_cart = ShopCartFactory(items=[])
+        shop_cart.create()
+        shop_cart.update_total_price()
+        self.assertEqual(shop_cart.total_price, 0)
+
+    def test_update_total_price_deleted(self):
+        """It should skip the total price of a Shop Cart deleted meanwhile"""
+        shop_cart = ShopCartFactory(items=[], total_price=500)
+        shop_cart.create()
+        self.assertEqual(shop_cart.total_price, 500)
+        with db.engine.begin() as conn:
+            conn.execute(db.delete(ShopCart).where(ShopCart.id == shop_cart.id))
+        shop_cart.update_total_price()
+        self.assertEqual(shop_cart.total_price, 500)
+
+    def test_update_totals(self):
+        """It should recompute the totals of many Shop Carts in one statement"""
+        shop_carts = ShopCartFactory.create_batch(3)
+        for shop_cart in shop_carts:
+            shop_cart.create()
+            ShopCartItemFactory(shop_cart=shop_cart, price=200, quantity=2).create()
+        ids = [shop_cart.id for shop_cart in shop_carts]
+        self.assertEqual(ShopCart.update_totals(ids[:2]), 2)
+        totals = [ShopCart.find(shop_cart_id).total_price for shop_cart_id in ids]
+        self.assertEqual(totals[:2], [400] * 2)
+        self.assertEqual(ShopCart.update_totals(), 3)
+        self.assertEqual(ShopCart.find(ids[2]).total_price, 400)
+
+    def test_money_conversions(self):
+        """It should turn amounts into whole cents and back exactly"""
+        self.assertEqual(to_cents(19.99), 1999)
+        self.assertEqual(to_cents("0.105"), 11)
+        self.assertEqual(to_cents(Decimal("1234567.89")), 123456789)
+        self.assertEqual(to_cents(5), 500)
+        self.assertEqual(to_amount(1999), 19.99)
+        self.assertEqual(to_amount(to_cents(0.29)), 0.29)
+        for amount in ("ten", "NaN", "Infinity", None):
+            self.assertRaises(DataValidationError, to_cents, amount)
+
+    def test_deserialize_bad_price(self):
+        """It should refuse a price that is not a number"""
+        data = ShopCartItemFactory().serialize()
+        data["price"] = "free"
+        self.assertRaises(DataValidationError, ShopCartItem().deserialize, data)
+
+
 ######################################################################
 #  Q U E R Y  T E S T   C A S E S
 ######################################################################
 class TestModelQueries(TestCase):
     """Shop Cart Model Query Tests"""
 
+    def tearDown(self):
+        """This runs after each test"""
+        db.session.remove()
+
     def test_find_by_name(self):
         """It should find a Shop Cart by name"""
         shop_carts = ShopCartFactory.create_batch(17)
@@ -262,6 +346,40 @@ class TestModelQueries(TestCase):
         for cart in found_carts:
             self.assertEqual(cart.user_id, user_id)
 
+    def test_find_item(self):
+        """It should find an Item of a Shop Cart and tell a missing cart from a missing item"""
+        shop_carts = ShopCartFactory.create_batch(2)
+        for shop_cart in shop_carts:
+            shop_cart.create()
+        item = ShopCartItemFactory(shop_cart=shop_carts[0], product_id=5)
+        item.create()
+        self.assertEqual(ShopCart.find_item(shop_carts[0].id, item_id=item.id), (True, item))
+        self.assertEqual(ShopCart.find_item(shop_carts[0].id, product_id=5), (True, item))
+        self.assertEqual(ShopCart.find_item(shop_carts[1].id, item_id=item.id), (True, None))
+        self.assertEqual(ShopCart.find_item(0, item_id=item.id), (False, None))
+
+    def test_serialize_sparse_fields(self):
+        """It should serialize only the fields asked for and leave the items unloaded"""
+        shop_cart = ShopCartFactory()
+        shop_cart.create()
+        expected = {"id": shop_cart.id, "status": shop_cart.status.name}
+        db.session.expunge_all()
+        options = ShopCart.load_options(["id", "status"], include_items=False)
+        found = ShopCart.find(expected["id"], *options)
+        self.assertEqual(found.serialize(["id", "status"], False), expected)
+        self.assertNotIn("items", found.__dict__)
+        self.assertNotIn("name", found.__dict__)
+
+    def test_load_options(self):
+        """It should load the items of every Shop Cart up front when they are included"""
+        shop_carts = ShopCartFactory.create_batch(3)
+        for shop_cart in shop_carts:
+            shop_cart.create()
+        db.session.expire_all()
+        self.assertEqual(len(ShopCart.load_options(["items"])), 1)
+        for found in ShopCart.find_by_user_id(shop_carts[0].user_id, *ShopCart.load_options()):
+            self.assertIn("items", found.__dict__)
+
     def test_find_by_user_id_not_found(self):
         """It should not find a Shop Cart when no match is found"""
         shop_carts = ShopCartFactory.create_batch(5)
@@ -292,6 +410,12 @@ class TestExceptionHandlers(TestCase):
         shop_cart = ShopCartFactory()
         self.assertRaises(DataValidationError, shop_cart.update)
 
+    @patch("service.models.db.session.commit")
+    def test_update_totals_exception(self, exception_mock):
+        """It should catch an update totals exception"""
+        exception_mock.side_effect = Exception()
+        self.assertRaises(DataValidationError, ShopCart.update_totals, [0])
+
     @patch("service.models.db.session.commit")
     def test_delete_exception(self, exception_mock):
         """It should catch a delete exception"""
@@ -116,6 +116,17 @@ class TestShopCartItem(TestCase):
         shop_cart_items = ShopCartItem.all()
         self.assertEqual(len(shop_cart_items), 10)
 
+    def test_find_by_product_id(self):
+        """It should find the first Item of a product across Shop Carts"""
+        shop_carts = ShopCartFactory.create_batch(2)
+        for shop_cart in shop_carts:
+            shop_cart.create()
+            ShopCartItemFactory(shop_cart=shop_cart, product_id=9).create()
+        found = ShopCartItem.find_by_product_id(9)
+        self.assertIsInstance(found, ShopCartItem)
+        self.assertEqual(found.shop_cart_id, shop_carts[0].id)
+        self.assertIsNone(ShopCartItem.find_by_product_id(10))
+
     def test_serialize_shop_cart_item(self):
         """It should serialize a Shop Cart Item"""
         shop_cart_item = ShopCartItemFactory()
@@ -125,7 +136,7 @@ class TestShopCartItem(TestCase):
         self.assertEqual(data["product_id"], shop_cart_item.product_id)
         self.assertEqual(data["shop_cart_id"], shop_cart_item.shop_cart_id)
         self.assertEqual(data["quantity"], shop_cart_item.quantity)
-        self.assertEqual(data["price"], float(shop_cart_item.price))
+        self.assertEqual(data["price"], shop_cart_item.price / 100)
 
     def test_deserialize_shop_cart_item(self):
         """It should deserialize a Shop Cart Item"""
@@ -137,7 +148,7 @@ class TestShopCartItem(TestCase):
         self.assertEqual(shop_cart_item.shop_cart_id, data.shop_cart_id)
         self.assertEqual(shop_cart_item.product_id, data.product_id)
         self.assertEqual(shop_cart_item.quantity, data.quantity)
-        self.assertEqual(shop_cart_item.price, float(data.price))
+        self.assertEqual(shop_cart_item.price, data.price)
 
     # # # + + + + + + + + + + + + + SAD PATHS + + + + + + + + + + + + + + +
     def test_deserialize_missing_data(self):